@@ -39,25 +39,15 @@ def check_temperatures(data):
             CONFIG["TEMPERATURES"]["sensors"][name]["alert"]
         )
 
-def check_battery_levels(data):
+def check_state_of_charge(data):
     """
-    Checks the charge level of the batteries
+    Checks the state of charge of the batteries, estimated from the battery gauges.
     """
-    battery_charge_12V = data["12V"]["charge_level"]
-
-    # This will ultimately be changed when we implement proper error checking and protocols.
-    # We should also check the batteries individually, but this will do for now.
-    if battery_charge_12V >= CONFIG["BATT_GAUGES"]["charge_levels"]["12V"]["alert"]:
-        raise CriticalError("Error: 12V battery charge level is critically low.")
-    if battery_charge_12V >= CONFIG["BATT_GAUGES"]["charge_levels"]["12V"]["warning"]:
-        raise WarningError("Warning: 12V battery charge level is low.")
-
-    battery_charge_24V = data["24V"]["charge_level"]
-
-    if battery_charge_24V >= CONFIG["BATT_GAUGES"]["charge_levels"]["24V"]["alert"]:
-        raise CriticalError("Error: 24V battery charge level is critically low.")
-    if battery_charge_24V >= CONFIG["BATT_GAUGES"]["charge_levels"]["24V"]["warning"]:
-        raise WarningError("Warning: 24V battery charge level is low.")
+    for name, battery in data.items():
+        if battery["soc"] <= CONFIG["BATTERY_SOC"]["soc_alert"]:
+            raise CriticalError(f"Error: {name} battery charge level is critically low.")
+        if battery["soc"] <= CONFIG["BATTERY_SOC"]["soc_warning"]:
+            raise WarningError(f"Warning: {name} battery charge level is low.")
 
 def check_fuel_cell(data):
     # TODO: figure out something to check. This function is here for redundency, but the fuel cell
@@ -71,7 +61,7 @@ _CHECKS = {
     CONFIG["TEMPERATURES"]["name"]: check_temperatures,
     CONFIG["FUELCELL_A"]["name"]: check_fuel_cell,
     CONFIG["FUELCELL_B"]["name"]: check_fuel_cell,
-    CONFIG["BATT_GAUGES"]["name"]: check_battery_levels,
+    CONFIG["BATTERY_SOC"]["name"]: check_state_of_charge,
 }
 
 def perform_check(name, data):
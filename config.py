@@ -2,7 +2,17 @@
 Config file containing information about the various sensors or systems and how they are connected
 to the RPI.
 
-NOTE: A lower priority value means that the data coming from these sensors will be processed first.
+NOTE: A lower priority value means that the data coming from these sensors will be processed first
+by the consumers whose SampleBus subscription is "prioritized" (the checks), the others read the
+samples in the order they were published.
+
+Sensors with an "adaptive" entry change their read interval at runtime, between "min_interval" and
+"max_interval" (s): they are read faster when a value changes by more than "rate_threshold"
+(units/s) or gets within "margin" (units) of its warning threshold. Changes of up to "quantum"
+(units), the resolution of the sensor, are ignored.
+
+Adding a "fifo" entry to the ADXL345 config, e.g. {"rate": 100, "watermark": 16, "interrupt_gpio": 17}
+switches it to high-rate capture (see Accelerometer).
 """
 
 CONFIG = {
@@ -36,9 +46,15 @@ CONFIG = {
         "priority": 0,
         "read_interval": 0, # delay already created by the conversion time of the sensors
         "name": "TEMPERATURES",
+        # quantum: one step of the DS18B20 at its coarsest resolution (9 bits)
+        "adaptive": {
+            "min_interval": 0, "max_interval": 5, "rate_threshold": 0.2, "margin": 10, "quantum": 0.5
+        },
+        # "resolution" of each sensor: 9 to 12 bits, or "auto" to get more precise as it nears "warn"
+        "resolution_margin": 20,
         "sensors": {
-            "battery_12V": {"warn": 0, "alert": 0, "max": 0, "address": 0x00000dc67e14},
-            "battery_24V": {"warn": 50, "alert": 80, "max": 0, "address": 0x00000e841698},
+            "battery_12V": {"warn": 0, "alert": 0, "max": 0, "address": 0x00000dc67e14, "resolution": "auto"},
+            "battery_24V": {"warn": 50, "alert": 80, "max": 0, "address": 0x00000e841698, "resolution": "auto"},
             # "fc_controllers": {"warn": 0, "alert": 0, "max": 0, "address": 0x000000000000},
             # "h2_plate": {"warn": 0, "alert": 0, "max": 0, "address": 0x000000000000},
             # "h2_tanks": {"warn": 0, "alert": 0, "max": 0, "address": 0x000000000000},
@@ -50,17 +66,24 @@ CONFIG = {
         "name": "BATT_GAUGES",
         "i2c_address": 0x64,
         "select_gpio": 13,
-        "charge_levels" : {
-            # coulomb counter values - these will definitely need to be adjusted
-            "12V": {
-                "warning": 1000,
-                "alert": 1500,
-            },
-            "24V": {
-                "warning": 1000,
-                "alert": 1500,
-            }
-        }
+    },
+    "BATTERY_SOC": {
+        "priority": 0,
+        "name": "BATTERY_SOC",
+        # sense resistor of the gauges (Ohm) and prescaler M of their charge counter
+        "sense_resistor": 0.05,
+        "prescaler": 4096,
+        # these will definitely need to be adjusted. "initial_soc" (0 to 1) is the state of charge
+        # at startup. Once the gauges are calibrated with full batteries
+        # (python -m sensors.battery_gauges 12V 24V), "full_count": 0xFFFF derives it from the
+        # charge register instead, which keeps counting while the Pi is off.
+        "batteries": {
+            "12V": {"capacity_ah": 20, "initial_soc": 1.0},
+            "24V": {"capacity_ah": 20, "initial_soc": 1.0},
+        },
+        # state of charge thresholds (0 to 1)
+        "soc_warning": 0.2,
+        "soc_alert": 0.1,
     },
     "ADXL345": {
         "priority": 1,
@@ -80,19 +103,66 @@ CONFIG = {
         "name": "Gyroscope",
         "i2c_address": 0x68,
     },
+    "ORIENTATION": {
+        "priority": 1,
+        "name": "Orientation",
+        # output rate (Hz)
+        "rate": 50,
+        # weight of the gyroscope against the accelerometer and compass, between 0 and 1: higher
+        # filters more noise but corrects the gyroscope drift more slowly
+        "alpha": 0.98,
+        "capacity": 200,
+    },
+    "ODOMETRY": {
+        "priority": 1,
+        "name": "ODOMETRY",
+        # fixes implying a faster speed are jumps (m/s)
+        "max_speed_ms": 15,
+        # fixes with a higher horizontal dilution of precision are ignored
+        "max_hdop": 5,
+        # moves shorter than this are position noise (m)
+        "min_move_m": 3,
+        # time constant of the speed smoothing (s)
+        "speed_time_constant_s": 5,
+        # (lat_deg, long_deg) of the finish line, None if unknown
+        "finish": None,
+    },
+    "COURSE": {
+        "priority": 1,
+        "name": "COURSE",
+        # race course file (see navigation/course.py), None when not racing
+        "file": None,
+        # size of the cells of the gate index (m), larger than the distance between two fixes
+        "cell_size_m": 50,
+    },
+    "SPEED_FILTER": {
+        "priority": 1,
+        "name": "SPEED",
+        # standard deviations of the accelerometer (m/s2) and GPS speed (m/s), and random walk of
+        # the accelerometer bias (m/s2 per sqrt(s))
+        "acceleration_noise": 0.3,
+        "speed_noise": 0.3,
+        "bias_noise": 0.01,
+        # the accelerometer alone drifts: stop publishing without a GPS speed for this long (s)
+        "gps_timeout_s": 5,
+        "capacity": 200,
+    },
     "GPS": {
         "serial": {
             "port": "/dev/tty0",
             "baudrate": 9600,
         },
         "priority": 1,
-        "read_interval": 3,
+        # the whole serial buffer is drained on each read, so this only sets how often the fix
+        # is published
+        "read_interval": 1,
         "name": "GPS",
     },
     "RASPBERRY_PI_CPU_TEMPERATURE": {
         "priority": 2,
         "read_interval": 5,
         "name": "RASPBERRY_PI_CPU_TEMPERATURE",
+        "adaptive": {"min_interval": 1, "max_interval": 10, "rate_threshold": 0.5, "margin": 15},
         "warning_temperature": 80,
         "alert_temperature": 90,
     },
@@ -125,6 +195,50 @@ TELE_CONFIG = {
 
 BUTTON_DEBOUNCE_S = 0.02
 
+# How the StreamReaders are run:
+#   "threads": one thread per sensor, publishing on the SampleBus
+#   "scheduler": all sensors on a single deadline-driven SensorScheduler thread, publishing on
+#                the SampleBus
+#   "asyncio": sensors and consumers as coroutines on a single event loop (AsyncRuntime), still
+#              publishing on and reading from the SampleBus, the processing stages on their own
+#              threads
+#   "processes": the sensors of ACQUISITION_PROCESSES in worker processes, the others on a
+#                SensorScheduler, all publishing on the SampleBus
+SENSOR_RUNTIME = "threads"
+
+# Sensors (CONFIG keys) read by each worker process in the "processes" runtime. Each worker has its
+# own GIL, so their timing does not suffer when the GUI or the telemetry are busy. The fuel cells
+# must stay in the main process: the startup and shutdown procedures drive them directly.
+ACQUISITION_PROCESSES = {
+    "smbus": ["ADXL345", "ITG3205", "HMC5883L", "BATT_GAUGES"],
+    "serial": ["GPS"],
+    "w1": ["TEMPERATURES"],
+}
+
+# SampleBus subscriptions of the consumers and what to do when they fall behind (policy):
+#   "block": the producers wait until the consumer catches up
+#   "drop_oldest": the oldest waiting sample is discarded
+#   "coalesce": only the newest waiting sample of each sensor is kept
+# "sensor_policies" overrides the policy for specific sensors (by sensor name).
+# "prioritized" subscriptions read the samples with the lowest priority value first.
+BUS_SUBSCRIPTIONS = {
+    # the checks only need the latest value of each sensor
+    "checks": {"capacity": 100, "policy": "coalesce", "prioritized": True},
+    "telemetry": {
+        "capacity": 100,
+        "policy": "drop_oldest",
+        "sensor_policies": {
+            "TEMPERATURES": "coalesce",
+            "BATT_GAUGES": "coalesce",
+            "BATTERY_SOC": "coalesce",
+            "Orientation": "coalesce",
+            "ODOMETRY": "coalesce",
+            "COURSE": "coalesce",
+            "SPEED": "coalesce",
+        },
+    },
+}
+
 import board
 ADC_ENABLE_PIN = board.D8
 
@@ -1,7 +1,10 @@
 import sys
+import math
+import time
 import qtawesome as qta
 from PyQt5 import QtCore, QtWidgets, QtGui
 from PyQt5.QtWidgets import QHBoxLayout, QVBoxLayout, QGridLayout
+from config import CONFIG
 
 class TimeWidget(QtWidgets.QLabel):
     """
@@ -114,6 +117,7 @@ class MyWidget(QtWidgets.QMainWindow):
         self.pressure = DataWidget("fa5s.compress-arrows-alt", unit="bar")
         self.power = DataWidget("fa5s.bolt", unit="W")
         self.tank = DataWidget("fa5s.spray-can", unit="L")
+        self.course = DataWidget("fa5s.flag-checkered", values=[0, 0], prefixes=["lap", "next buoy (m)"])
 
         self.assert_signal.connect(self.handle_alert)
 
@@ -133,6 +137,7 @@ class MyWidget(QtWidgets.QMainWindow):
         layout3.addWidget(self.pressure)
         layout3.addWidget(self.power)
         layout3.addWidget(self.tank)
+        layout3.addWidget(self.course)
         layout1.addLayout(layout3,2,0)
 
         widget = QtWidgets.QWidget()
@@ -155,11 +160,16 @@ class GUI(object):
     https://stackoverflow.com/questions/49971584/updating-pyqt5-gui-with-live-data
     """
     ASSERT_LIFETIME = 2
+    KNOTS_TO_KMH = 1.852
+    MS_TO_KMH = 3.6
 
-    def __init__(self):
+    def __init__(self, snapshots=None):
         """
         This class is the main class of the GUI.
+        snapshots (SnapshotStore): The store holding the current value of every sensor. When
+            given, the displayed data is refreshed from it on every update.
         """
+        self.snapshots = snapshots
         self.app = QtWidgets.QApplication([])
         self.widget = MyWidget()
         
@@ -169,7 +179,7 @@ class GUI(object):
         self.in_assert = False
         self.assert_counter = 0
 
-        self.current_data = {"batt_temp": 0.0, "fca_temp": 0.0, "fcb_temp": 0.0, "speed": 0.0, "total_power": 0.0, "est_auto": 0.0, "total_tank": 0.0, "pressure": 0.0, "efficiency": 0.0} 
+        self.current_data = {"batt_temp": 0.0, "fca_temp": 0.0, "fcb_temp": 0.0, "speed": 0.0, "total_power": 0.0, "est_auto": 0.0, "total_tank": 0.0, "pressure": 0.0, "efficiency": 0.0, "lap": 0.0, "next_buoy": 0.0}
         timer = QtCore.QTimer(self.widget)
         timer.timeout.connect(self.update_widget)
         timer.start(1000)
@@ -182,10 +192,64 @@ class GUI(object):
         """
         self.current_data = {**self.current_data, **kwargs}
 
+    def read_snapshots(self):
+        """
+        Reads the data to display from the current value of the sensors. Sensors that were never
+        read are left out.
+        """
+        data = {}
+
+        fc_a = self.snapshots.value(CONFIG["FUELCELL_A"]["name"])
+        fc_b = self.snapshots.value(CONFIG["FUELCELL_B"]["name"])
+        if fc_a:
+            data["fca_temp"] = fc_a.get("FCT1", 0.0)
+        if fc_b:
+            data["fcb_temp"] = fc_b.get("FCT1", 0.0)
+        if fc_a and fc_b:
+            data["total_power"] = fc_a.get("FC_W", 0.0) + fc_b.get("FC_W", 0.0)
+
+        temperatures = self.snapshots.value(CONFIG["TEMPERATURES"]["name"])
+        if temperatures:
+            battery_temperatures = [
+                t for name, t in temperatures.items() if name.startswith("battery") and not math.isnan(t)
+            ]
+            if battery_temperatures:
+                data["batt_temp"] = max(battery_temperatures)
+
+        # filtered speed while it is being published, GPS speed otherwise
+        speed = self.snapshots.get(CONFIG["SPEED_FILTER"]["name"])
+        gps = self.snapshots.value(CONFIG["GPS"]["name"])
+        if speed and time.monotonic() - speed.monotonic < CONFIG["SPEED_FILTER"]["gps_timeout_s"]:
+            data["speed"] = float(speed.values["speed_ms"][-1]) * self.MS_TO_KMH
+        elif gps and gps.get("speed_knots") is not None:
+            data["speed"] = gps["speed_knots"] * self.KNOTS_TO_KMH
+
+        # distance until the first battery is empty, at the current power and the average speed of
+        # the trip (the current speed before the trip has started)
+        odometry = self.snapshots.value(CONFIG["ODOMETRY"]["name"])
+        speed = data.get("speed")
+        if odometry and odometry["average_speed_ms"] > 0:
+            speed = odometry["average_speed_ms"] * self.MS_TO_KMH
+        batteries = self.snapshots.value(CONFIG["BATTERY_SOC"]["name"])
+        if batteries and speed is not None:
+            hours_left = [b["hours_left"] for b in batteries.values() if b["hours_left"] is not None]
+            if hours_left:
+                data["est_auto"] = min(hours_left) * speed
+
+        course = self.snapshots.value(CONFIG["COURSE"]["name"])
+        if course:
+            data["lap"] = course["lap"]
+            data["next_buoy"] = course["distance_to_next_m"]
+
+        return data
+
     def update_widget(self):
         """
         Updates the widget with the current data.
         """
+        if self.snapshots is not None:
+            self.update_data(**self.read_snapshots())
+
         self.widget.time.show_time()
         self.widget.eff_widget.update(self.current_data["efficiency"])
         self.widget.speed.update([self.current_data["speed"]])
@@ -194,6 +258,7 @@ class GUI(object):
         self.widget.power.update([self.current_data["total_power"]])
         self.widget.tank.update([self.current_data["total_tank"]])
         self.widget.autonomy.update([self.current_data["est_auto"]])
+        self.widget.course.update([self.current_data["lap"], self.current_data["next_buoy"]])
 
         if self.in_assert:
             self.assert_counter += 1
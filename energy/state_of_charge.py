@@ -0,0 +1,125 @@
+"""
+Estimates the state of charge and remaining energy of the batteries from the raw LTC2944 registers
+read by BatteryGauges. Everything is updated incrementally, in constant time per sample.
+LTC2944 datasheet: https://www.analog.com/media/en/technical-documentation/data-sheets/2944fa.pdf
+"""
+from multithreading.stage import Stage
+from config import CONFIG
+
+
+class BatteryEstimator:
+    """
+    Converts the registers of a single LTC2944 and integrates its charge counter.
+    """
+
+    # full scale of the voltage ADC (V)
+    VOLTAGE_FULL_SCALE = 70.8
+    # full scale of the current ADC, across the sense resistor (V)
+    SENSE_FULL_SCALE = 0.064
+    # charge of one accumulated charge LSB (C) with a 50 mOhm sense resistor and M = 4096
+    CHARGE_LSB_C = 0.340e-3 * 3600
+    REFERENCE_SENSE_RESISTOR = 0.05
+    REFERENCE_PRESCALER = 4096
+
+    COUNTER_RANGE = 0x10000
+    CURRENT_ZERO = 0x7FFF
+
+    def __init__(self, capacity_ah, sense_resistor, prescaler, initial_soc=1.0, full_count=None):
+        """
+        Args:
+            capacity_ah (float): The capacity of the battery (Ah).
+            sense_resistor (float): The sense resistor of the gauge (Ohm).
+            prescaler (int): The prescaler M of the charge counter.
+            initial_soc (float): The state of charge at startup (0 to 1), used when `full_count`
+                is None.
+            full_count (int): The value of the charge register when the battery was last full (see
+                `BatteryGauges.calibrate_full()`), None if the gauge was not calibrated. The state
+                of charge at startup is then derived from the charge register.
+        """
+        self.capacity_c = capacity_ah * 3600
+        self.full_count = full_count
+        self.initial_soc = initial_soc
+
+        # scale factors, from register counts to SI units
+        self.volts_per_count = self.VOLTAGE_FULL_SCALE / (self.COUNTER_RANGE - 1)
+        self.amps_per_count = self.SENSE_FULL_SCALE / sense_resistor / self.CURRENT_ZERO
+        self.coulombs_per_count = (
+            self.CHARGE_LSB_C * (self.REFERENCE_SENSE_RESISTOR / sense_resistor)
+            * (prescaler / self.REFERENCE_PRESCALER)
+        )
+
+        self._last_count = None
+        # charge gained since startup (C), negative when discharging
+        self.charge = 0.0
+
+    def update(self, charge_count, voltage_count, current_count):
+        """
+        Updates the estimation with new register values.
+
+        Returns:
+            dict: The voltage (V), current (A, negative when discharging), power (W), charge gained
+            since startup (C), state of charge (0 to 1), remaining energy (Wh) and time left at the
+            current power (h, None when not discharging).
+        """
+        if self._last_count is None:
+            if self.full_count is not None:
+                # the gauge is powered by the battery, so its counter keeps running while the Pi is
+                # off: the charge used is how far it went from its value when the battery was full.
+                # This assumes the counter did not wrap around meanwhile (its range covers 22 Ah with
+                # the default sense resistor and prescaler) and the gauge was not reset, which
+                # brings it back to mid-scale: calibrate again after that.
+                self.initial_soc = 1.0 - (self.full_count - charge_count) * self.coulombs_per_count / self.capacity_c
+        else:
+            # the counter wraps around: take the shortest way between the two counts
+            delta = (charge_count - self._last_count + self.COUNTER_RANGE // 2) % self.COUNTER_RANGE
+            self.charge += (delta - self.COUNTER_RANGE // 2) * self.coulombs_per_count
+        self._last_count = charge_count
+
+        voltage = voltage_count * self.volts_per_count
+        current = (current_count - self.CURRENT_ZERO) * self.amps_per_count
+        power = voltage * current
+        soc = min(max(self.initial_soc + self.charge / self.capacity_c, 0.0), 1.0)
+        remaining_wh = soc * self.capacity_c / 3600 * voltage
+
+        return {
+            "voltage": voltage,
+            "current": current,
+            "power": power,
+            "charge": self.charge,
+            "soc": soc,
+            "remaining_wh": remaining_wh,
+            "hours_left": remaining_wh / -power if power < 0 else None,
+        }
+
+
+class StateOfChargeEstimator(Stage):
+    """
+    Publishes the state of charge of each battery measured by BatteryGauges as its own stream,
+    used by the checks and the GUI autonomy.
+    """
+
+    def __init__(self, bus, config):
+        self.gauges = CONFIG["BATT_GAUGES"]["name"]
+        super().__init__(bus, config, (self.gauges,))
+
+        self.batteries = {
+            name: BatteryEstimator(
+                battery["capacity_ah"], config["sense_resistor"], config["prescaler"],
+                battery.get("initial_soc", 1.0), battery.get("full_count")
+            )
+            for name, battery in config["batteries"].items()
+        }
+
+    def process_batch(self, items):
+        for sample in items:
+            self.publish(
+                {
+                    name: estimator.update(
+                        sample.values[name]["charge_level"],
+                        sample.values[name]["voltage"],
+                        sample.values[name]["current"],
+                    )
+                    for name, estimator in self.batteries.items()
+                },
+                sample.monotonic,
+            )
@@ -6,29 +6,62 @@ properly. It will also wait for a button press before starting all the procedure
 from sensors.imu.accelerometer import Accelerometer
 from sensors.imu.gyroscope import Gyroscope
 from sensors.imu.compass import Compass
+from sensors.imu.fusion import OrientationFusion
 from sensors.gps import GPS
 from sensors.temperature import Thermocouples
 from sensors.rpmonitor import RPCPUTemperature
+from sensors.battery_gauges import BatteryGauges
 from sensors.start_button import StartButton
 from fuel_cell.fuel_cell import FuelCell
-import threading
-from queue import PriorityQueue, Queue
+from energy.state_of_charge import StateOfChargeEstimator
+from navigation.odometry import Odometry
+from navigation.course import CourseTiming
+from navigation.speed_filter import SpeedFilter
+import json
+import signal
 from multithreading.consumers import DataConsumer, LogConsumer
-from config import CONFIG, TELE_CONFIG
+from multithreading.scheduler import SensorScheduler
+from multithreading.async_runtime import AsyncRuntime
+from multithreading.sample_bus import SampleBus
+from multithreading.snapshot_store import SnapshotStore
+from multithreading.instrumentation import Instrumentation
+from multithreading.process_acquisition import ProcessAcquisition
+from multithreading.protocols.i2c_arbiter import I2CArbiter
+from multithreading.protocols.smbus_stream_reader import SMBusStreamReader
+from config import CONFIG, TELE_CONFIG, SENSOR_RUNTIME, BUS_SUBSCRIPTIONS, ACQUISITION_PROCESSES
 from display.ui import GUI
 from procedures.shutdown import BoatStopper
 from procedures.start import BoatStarter
 import time
 
 
+# StreamReader of each sensor, by CONFIG key (the fuel cells are built separately)
+SENSORS = {
+    "TEMPERATURES": Thermocouples,
+    "RASPBERRY_PI_CPU_TEMPERATURE": RPCPUTemperature,
+    "GPS": GPS,
+    "ADXL345": Accelerometer,
+    "ITG3205": Gyroscope,
+    "HMC5883L": Compass,
+    "BATT_GAUGES": BatteryGauges,
+}
+
+
 def main():
-    # Setup the PriorityQueues and thread lock
-    data_queue = PriorityQueue(maxsize=100)
-    log_queue = Queue(maxsize=100)
-    lock = threading.Lock()
+    # Setup the data transport. No global lock is needed: the bus is safe to use from its
+    # producers and consumers. Samples are published once on the bus and each consumer reads its
+    # own subscription.
+    lock = None
+    bus = SampleBus()
+    data_queue, log_queue = None, None
+    check_queue = bus.subscribe("checks", **BUS_SUBSCRIPTIONS["checks"])
+    telemetry_queue = bus.subscribe("telemetry", **BUS_SUBSCRIPTIONS["telemetry"])
 
-    # Initialize the GUI. Data is transfered later through the consumers
-    gui = GUI()
+    # Current value of every sensor, updated by the StreamReaders
+    snapshots = SnapshotStore()
+
+    # Initialize the GUI. Data is transfered later through the consumers and the snapshots
+    gui = GUI(snapshots)
 
     # Initialize different objects. This does not trigger any startup/initialisation for these
     # systems at hardware level
@@ -37,27 +70,75 @@ def main():
     fc_a = FuelCell(lock, data_queue, log_queue, CONFIG["FUELCELL_A"])
     fc_b = FuelCell(lock, data_queue, log_queue, CONFIG["FUELCELL_B"])
 
-    # Thermocouple
-    thermocouples = Thermocouples(lock, data_queue, log_queue, CONFIG["TEMPERATURES"])
-    # Sensors
-    cputemp = RPCPUTemperature(lock, data_queue, log_queue, CONFIG["RP_CPU_TEMP"])
-    gps = GPS(lock, data_queue, log_queue, CONFIG["GPS"])
-    # IMU
-    accelerometer = Accelerometer(lock, data_queue, log_queue, CONFIG["ADXL345"])
-    gyroscope = Gyroscope(lock, data_queue, log_queue, CONFIG["ITG3205"])
-    compass = Compass(lock, data_queue, log_queue, CONFIG["HMC5883L"])
+    # Sensors. In the "processes" runtime, the worker processes build their own
+    processes = ACQUISITION_PROCESSES if SENSOR_RUNTIME == "processes" else {}
+    isolated = {key for keys in processes.values() for key in keys}
+    sensors = [
+        reader_class(lock, data_queue, log_queue, CONFIG[key])
+        for key, reader_class in SENSORS.items() if key not in isolated
+    ]
 
     # Start button
     start_button = StartButton(CONFIG["START_BUTTON"])
 
     # Build the consumers
-    data_cons = DataConsumer(lock, data_queue, gui)
-    log_cons = LogConsumer(lock, log_queue, gui, TELE_CONFIG["serial_port"])
+    data_cons = DataConsumer(lock, check_queue, gui)
+    log_cons = LogConsumer(lock, telemetry_queue, gui, TELE_CONFIG["serial_port"])
+
+    # Processing stages, deriving new streams from the samples on the bus
+    stages = [
+        OrientationFusion(bus, CONFIG["ORIENTATION"]),
+        StateOfChargeEstimator(bus, CONFIG["BATTERY_SOC"]),
+        Odometry(bus, CONFIG["ODOMETRY"]),
+        SpeedFilter(bus, CONFIG["SPEED_FILTER"]),
+    ]
+    if CONFIG["COURSE"]["file"] is not None:
+        stages.append(CourseTiming(bus, CONFIG["COURSE"]))
 
     # Threads
+    readers = [fc_a, fc_b] + sensors
+    snapshots.register(*readers, *stages)
+    bus.register(*readers)
+
+    # All the transactions on the I2C bus go through a single thread
+    arbiter = I2CArbiter()
+    arbiter.register(*[reader for reader in readers if isinstance(reader, SMBusStreamReader)])
+
+    # Timing stats of the whole pipeline, printed on demand with: kill -USR1 <pid>
+    instrumentation = Instrumentation()
+    instrumentation.register(*readers)
+    instrumentation.register_consumers(data_cons, log_cons, *stages)
+    instrumentation.register_bus(bus)
+    instrumentation.register_arbiter(arbiter)
+    signal.signal(signal.SIGUSR1, lambda *_: print(json.dumps(instrumentation.dump(), indent=2)))
+
+    if SENSOR_RUNTIME == "processes":
+        # the isolated sensors publish through shared memory, the others run on a scheduler
+        acquisition = ProcessAcquisition(bus, snapshots, {
+            name: [(SENSORS[key], CONFIG[key]) for key in keys] for name, keys in processes.items()
+        })
+        scheduler = SensorScheduler()
+        scheduler.register(*readers)
+        threads = [acquisition, scheduler, data_cons, log_cons] + stages
+    elif SENSOR_RUNTIME == "scheduler":
+        # a single thread runs all the sensors at a fixed rate
+        scheduler = SensorScheduler()
+        scheduler.register(*readers)
+        threads = [scheduler, data_cons, log_cons] + stages
+    elif SENSOR_RUNTIME == "asyncio":
+        # a single thread runs the event loop for the sensors and consumers
+        runtime = AsyncRuntime()
+        runtime.register(*readers, data_cons, log_cons)
+        # the stages keep their own threads
+        threads = [runtime] + stages
+    else:
+        threads = readers + [data_cons, log_cons] + stages
+
     starter = BoatStarter(10, fc_a, fc_b, None, None, None)
     stopper = BoatStopper(10, fc_a, fc_b, None, None)
-    stopper.set_threads(fc_a, fc_b, cputemp, gps, accelerometer, gyroscope, compass, data_cons, log_cons)
+    # the arbiter is stopped last, once no reader uses it anymore
+    threads.append(arbiter)
+    stopper.set_threads(*threads)
 
     # Startup: we wait for a button to be pressed before triggering the startup procedure
     while not start_button.was_pressed():
@@ -66,17 +147,8 @@ def main():
     starter.startup_procedure()
 
     # Start threads for all systems
-    fc_a.start()
-    fc_b.start()
-    cputemp.start()
-    gps.start()
-    accelerometer.start()
-    gyroscope.start()
-    compass.start()
-    thermocouples.start()
-    
-    data_cons.start()
-    log_cons.start()
+    for thread in threads:
+        thread.start()
 
     # Shutdown: we wait for a button to be pressed before triggering the shutdown procedure
     print("GUI disabled in development")
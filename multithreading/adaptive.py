@@ -0,0 +1,80 @@
+import math
+
+
+class AdaptiveRate:
+    """
+    Adapts the read interval of a StreamReader to the dynamics of its signal.
+
+    Each monitored value gets an urgency between 0 and 1, the highest of:
+      - how fast it changes, relative to `rate_threshold` (units/s). Changes of up to `quantum`
+        units (the resolution of the sensor) are ignored, so the flicker of the last digit does
+        not count as a fast signal: the rate is measured from the last value that moved by more.
+      - how close it is to its warning threshold, relative to `margin` (units)
+    The read interval goes from `max_interval` (urgency 0, flat signal far from any threshold)
+    down to `min_interval` (urgency 1). It shortens right away but only moves `SLOWDOWN_RATE` of
+    the way towards a longer interval per read, so a short lull does not make us miss the next
+    spike.
+    """
+
+    SLOWDOWN_RATE = 0.25
+
+    def __init__(self, config):
+        """
+        Args:
+            config (dict): The "adaptive" entry of the sensor config, with the keys
+                "min_interval", "max_interval", "rate_threshold", "margin" and optionally
+                "quantum" (0 by default).
+        """
+        self.min_interval = config["min_interval"]
+        self.max_interval = config["max_interval"]
+        self.rate_threshold = config["rate_threshold"]
+        self.margin = config["margin"]
+        self.quantum = config.get("quantum", 0)
+        # start fast until the signal proves to be flat
+        self.interval = self.min_interval
+        self._previous = {}
+
+    def urgency(self, key, value, warn, now):
+        """
+        Returns:
+            float: How urgently the value should be read again, between 0 and 1.
+        """
+        urgency = 0.0
+        previous = self._previous.get(key)
+        if previous is None or abs(value - previous[0]) > self.quantum:
+            if previous is not None and now > previous[1]:
+                rate = abs(value - previous[0]) / (now - previous[1])
+                urgency = min(1.0, rate / self.rate_threshold)
+            self._previous[key] = (value, now)
+
+        # placeholder thresholds are left at 0 in the config: they are not real limits
+        if warn:
+            proximity = 1.0 - (warn - value) / self.margin
+            urgency = max(urgency, min(max(proximity, 0.0), 1.0))
+
+        return urgency
+
+    def next_interval(self, monitored_values, now):
+        """
+        Computes the read interval after a new sample.
+
+        Args:
+            monitored_values (iterable): (key, value, warning threshold) tuples for the values of
+                the sample. The threshold is None (or 0, unset) if the value has none.
+            now (float): The monotonic time of the sample.
+
+        Returns:
+            float: The new read interval in seconds.
+        """
+        urgency = 0.0
+        for key, value, warn in monitored_values:
+            if value is None or math.isnan(value):
+                continue
+            urgency = max(urgency, self.urgency(key, value, warn, now))
+
+        target = self.max_interval - urgency * (self.max_interval - self.min_interval)
+        if target < self.interval:
+            self.interval = target
+        else:
+            self.interval += (target - self.interval) * self.SLOWDOWN_RATE
+        return self.interval
@@ -0,0 +1,90 @@
+from multithreading.thread import LoopingThread
+from multithreading.stream_reader import StreamReader
+from concurrent.futures import ThreadPoolExecutor
+import asyncio
+
+
+class AsyncRuntime(LoopingThread):
+    """
+    Runs StreamReaders and consumers as coroutines on a single asyncio event loop, on its own
+    thread so the Qt GUI keeps the main thread.
+
+    Serial readers wait for the port to become readable instead of polling it, consumers wait for
+    their SampleBus subscription to signal new samples, and the blocking SMBus/1-Wire/serial calls
+    are offloaded to thread pools. Each reader has at most one read in flight, so the readers' pool
+    has a thread per reader: a sensor blocking for long (1-Wire conversions, FIFO watermark waits)
+    never delays the others. The blocking consumers (see `Consumer.BLOCKING_IO`) get their own
+    pool, so a stalled telemetry write never holds up a read. The readers must publish on a SampleBus and the
+    consumers read from its subscriptions, without a lock, so their overflow policies apply like
+    in the other runtimes. The readers are closed when the runtime stops.
+    """
+
+    def __init__(self):
+        super().__init__()
+        self.readers = []
+        self.consumers = []
+        self._loop = None
+        self._main_task = None
+
+    def register(self, *tasks):
+        """
+        Adds StreamReaders and consumers to the runtime. Must be called before `start()`.
+        """
+        for task in tasks:
+            if isinstance(task, StreamReader):
+                self.readers.append(task)
+            else:
+                self.consumers.append(task)
+
+    def stop(self):
+        """
+        Sends a stop signal to the thread and cancels all the running coroutines.
+        """
+        super().stop()
+        if self._loop is not None:
+            self._loop.call_soon_threadsafe(self._main_task.cancel)
+
+    def run(self):
+        try:
+            asyncio.run(self._main())
+        except asyncio.CancelledError:
+            pass
+        finally:
+            for reader in self.readers:
+                try:
+                    reader.close()
+                except Exception as e:
+                    print(f"AsyncRuntime: {reader.config['name']}: could not close: {e}")
+
+    def _report_failure(self, task):
+        # tasks fail independently, like the threads they replace
+        if not task.cancelled() and task.exception() is not None:
+            print(f"AsyncRuntime: {task.get_name()} stopped: {task.exception()}")
+
+    async def _main(self):
+        self._main_task = asyncio.current_task()
+        self._loop = asyncio.get_running_loop()
+        if self.stopped():
+            return
+
+        reader_executor = ThreadPoolExecutor(max_workers=max(len(self.readers), 1))
+        consumer_executor = ThreadPoolExecutor(
+            max_workers=max(sum(consumer.BLOCKING_IO for consumer in self.consumers), 1)
+        )
+        tasks = [
+            asyncio.create_task(reader.run_async(reader_executor), name=reader.config["name"])
+            for reader in self.readers
+        ]
+        tasks += [
+            asyncio.create_task(consumer.run_async(consumer_executor), name=type(consumer).__name__)
+            for consumer in self.consumers
+        ]
+        for task in tasks:
+            task.add_done_callback(self._report_failure)
+
+        try:
+            await asyncio.gather(*tasks, return_exceptions=True)
+        finally:
+            reader_executor.shutdown(wait=False, cancel_futures=True)
+            consumer_executor.shutdown(wait=False, cancel_futures=True)
+
@@ -3,23 +3,124 @@ from asserts.asserts import WarningError, CriticalError
 from multithreading.thread import LoopingThread
 from serial.serialutil import SerialTimeoutException
 from utils import stringify_data
+from queue import Empty
 import abc
+import asyncio
 import serial
+import time
 
 
 class Consumer(LoopingThread):
     """
-    This class is a base class for consumers. Consumers are threads that consume data from a queue.
+    This class is a base class for consumers. Consumers are threads that consume samples from a
+    queue (or a SampleBus subscription).
     """
 
+    # How long `run()` waits for an item before checking whether the thread was stopped
+    GET_TIMEOUT_S = 0.5
+    # Maximum number of items handled per wakeup
+    BATCH_SIZE = 32
+
+    # Set to True by consumers whose `process()` method blocks on I/O, so the AsyncRuntime runs it
+    # in its executor instead of on the event loop.
+    BLOCKING_IO = False
+
     def __init__(self, lock, queue):
         super(Consumer, self).__init__()
         self.lock = lock
         self.queue = queue
+        # set by `Instrumentation.register_consumers()`
+        self.stats = None
 
-    def run(self):
+    def process(self, item):
+        """
+        Handles a single item taken from the queue. Should be overriden by child class.
+        """
         pass
 
+    def process_batch(self, items):
+        """
+        Handles all the items taken from the queue during one wakeup. Can be overriden by child
+        classes that handle a batch more efficiently than one item at a time.
+        """
+        for item in items:
+            self.process(item)
+
+    def timed_process_batch(self, items):
+        """
+        Handles a batch, recording its size and processing time if the consumer is instrumented.
+        """
+        if self.stats is None:
+            self.process_batch(items)
+            return
+
+        start = time.monotonic()
+        try:
+            self.process_batch(items)
+        finally:
+            self.stats.record_batch(len(items), time.monotonic() - start)
+
+    def get_batch(self):
+        """
+        Waits for an item, then takes all the other items already available in the queue, up to
+        `BATCH_SIZE` items in total.
+
+        Returns:
+            list: The items taken from the queue. Empty if no item arrived within `GET_TIMEOUT_S`.
+        """
+        if hasattr(self.queue, "get_batch"):
+            # SampleBus subscription: drained under a single lock acquisition
+            return self.queue.get_batch(self.BATCH_SIZE, timeout=self.GET_TIMEOUT_S)
+
+        try:
+            items = [self.queue.get(timeout=self.GET_TIMEOUT_S)]
+        except Empty:
+            return []
+
+        try:
+            while len(items) < self.BATCH_SIZE:
+                items.append(self.queue.get_nowait())
+        except Empty:
+            pass
+
+        return items
+
+    def run(self):
+        while not self.stopped():
+            if self.lock:
+                with self.lock:
+                    items = self.get_batch()
+            else:
+                items = self.get_batch()
+
+            if not items:
+                continue
+
+            self.timed_process_batch(items)
+            for _ in items:
+                self.queue.task_done()
+
+    async def run_async(self, executor):
+        """
+        Coroutine equivalent of `run()` used by the AsyncRuntime. The queue must be a SampleBus
+        subscription: it is drained without waiting on its lock, and the coroutine sleeps until the
+        subscription signals a new sample.
+        """
+        loop = asyncio.get_running_loop()
+        available = asyncio.Event()
+        self.queue.listen(lambda: loop.call_soon_threadsafe(available.set))
+        while not self.stopped():
+            items = self.queue.get_batch(self.BATCH_SIZE, timeout=0)
+            if not items:
+                await available.wait()
+                available.clear()
+                continue
+
+            if self.BLOCKING_IO:
+                await loop.run_in_executor(executor, self.timed_process_batch, items)
+            else:
+                self.timed_process_batch(items)
+
 
 class DataConsumer(Consumer):
     """
@@ -30,40 +131,50 @@ class DataConsumer(Consumer):
         super().__init__(lock, queue)
         self.gui = gui
 
-    def run(self):
+    def process(self, item):
         """
-        Reads the data from the queue and does the appropriate checks on it.
+        Does the appropriate checks on an item of the queue.
 
         Raises:
             CriticalError: If the data is critical.
             WarningError: If the data is a warning.
         """
-        while not self.stopped():
-            self.lock.acquire()
-            name, data = self.queue.get()
-            self.lock.release()
+        self.process_batch([item])
+
+    def process_batch(self, items):
+        """
+        Does the appropriate checks on all the items of a batch. Warnings are shown once per
+        batch, critical errors are raised right away.
 
+        Raises:
+            CriticalError: If the data is critical.
+        """
+        warning = False
+        for sample in items:
             try:
-                perform_check(name)(data)
+                perform_check(sample.sensor, sample.values)
             except CriticalError as e:
                self.gui.dispatch_alert("alert")
                raise e  # this will cause emergency shutdown.
             except WarningError as e:
-                self.gui.dispatch_alert("warning")
+                warning = True
                 print(e)
             except Exception as e:
                 print(e)
-                print(data)
+                print(sample)
+
+        if warning:
+            self.gui.dispatch_alert("warning")
 
-            self.queue.task_done()
-           
 
 class LogConsumer(Consumer):
     """
-    The LogConsumer class consumes data from the queue and displays it on the screen /
-    writes to IOT cloud by sending it to the MKR1500.
+    The LogConsumer class consumes data from the queue and writes it to IOT cloud by sending it
+    to the MKR1500.
     """
 
+    BLOCKING_IO = True
+
     def __init__(self, lock, log_queue, gui, serial_port):
         super().__init__(lock, log_queue)
         self.serial_port = serial_port
@@ -73,30 +184,36 @@ class LogConsumer(Consumer):
     def efficiency_report(self, data):
         pass
 
-    def write_telemetry(self, name, data):
+    def write_telemetry(self, sample):
         """
         This method writes the telemetry data to the MKR1500.
-        name (str): The name of the telemetry data.
-        data (dict): The value of the telemetry data.
+        sample (Sample): The telemetry data.
         """
-        data_str = stringify_data(name, data)
+        data_str = stringify_data(sample)
         data_str = data_str.encode("utf-8")
         self.serial.write(data_str)
 
-    def write_screen(self, data):
-        self.gui.update(data)
+    def write_telemetry_batch(self, items):
+        """
+        Writes the telemetry data of a batch of samples to the MKR1500 in a single write.
+        items (list): The samples to write.
+        """
+        data_str = "".join(stringify_data(sample) for sample in items)
+        self.serial.write(data_str.encode("utf-8"))
 
-    def run(self):
+    def process(self, item):
         """
-        Reads the data from the queue and writes it to the MKR1500 and the screen.
+        Writes an item of the queue to the MKR1500.
         """
-        while not self.stopped():
-            try:
-                self.lock.acquire()
-                name, data = self.queue.get()
-                self.lock.release()
-                self.write_telemetry(name, data)
-                self.write_screen(data)
-                self.queue.task_done()
-            except SerialTimeoutException:
-                print("Writing timeout. You may want to check the connection.")
+        self.process_batch([item])
+
+    def process_batch(self, items):
+        """
+        Writes a batch of items of the queue to the MKR1500. The screen is refreshed by the GUI
+        from the SnapshotStore.
+        """
+        try:
+            self.write_telemetry_batch(items)
+        except SerialTimeoutException:
+            print("Writing timeout. You may want to check the connection.")
+
@@ -0,0 +1,168 @@
+"""
+Lightweight timing instrumentation for the acquisition pipeline. Everything is recorded in
+fixed-bucket histograms and plain counters (no allocation per sample), so it can be left on while
+racing.
+"""
+from bisect import bisect_left
+import time
+
+# Upper bounds (in seconds) of the buckets used for all the timing histograms. Values larger than
+# the last bound go in an extra overflow bucket.
+TIME_BUCKETS_S = (0.0001, 0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1, 5)
+
+
+class Histogram:
+    """
+    Histogram with fixed bucket bounds.
+    """
+
+    def __init__(self, bounds=TIME_BUCKETS_S):
+        self.bounds = bounds
+        self.counts = [0] * (len(bounds) + 1)
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def record(self, value):
+        self.counts[bisect_left(self.bounds, value)] += 1
+        self.count += 1
+        self.total += value
+        if value > self.max:
+            self.max = value
+
+    def snapshot(self):
+        """
+        Returns:
+            dict: The number of values in each bucket (by upper bound), their count, mean and max.
+        """
+        buckets = {f"<={bound}": count for bound, count in zip(self.bounds, self.counts)}
+        buckets[f">{self.bounds[-1]}"] = self.counts[-1]
+        return {
+            "count": self.count,
+            "mean": self.total / self.count if self.count else 0.0,
+            "max": self.max,
+            "buckets": buckets,
+        }
+
+
+class SensorStats:
+    """
+    Timing of the acquisitions of a single StreamReader.
+    """
+
+    def __init__(self):
+        self.read_latency = Histogram()
+        # difference between the actual time between two reads and the configured `read_interval`
+        self.period_jitter = Histogram()
+        self.connection_errors = 0
+        self.invalid_data = 0
+        self._last_read = None
+
+    def record_read(self, start, end, read_interval):
+        """
+        Records a read started at `start` and finished at `end` (monotonic times).
+        """
+        self.read_latency.record(end - start)
+        if self._last_read is not None:
+            self.period_jitter.record(abs(start - self._last_read - read_interval))
+        self._last_read = start
+
+    def snapshot(self):
+        return {
+            "read_latency": self.read_latency.snapshot(),
+            "period_jitter": self.period_jitter.snapshot(),
+            "connection_errors": self.connection_errors,
+            "invalid_data": self.invalid_data,
+        }
+
+
+class ConsumerStats:
+    """
+    Timing of the batches handled by a consumer.
+    """
+
+    def __init__(self):
+        self.batch_duration = Histogram()
+        self.batch_size = Histogram(bounds=(1, 2, 4, 8, 16, 32, 64))
+
+    def record_batch(self, size, duration):
+        self.batch_size.record(size)
+        self.batch_duration.record(duration)
+
+    def snapshot(self):
+        return {
+            "batch_duration": self.batch_duration.snapshot(),
+            "batch_size": self.batch_size.snapshot(),
+        }
+
+
+class Instrumentation:
+    """
+    Collects the stats of the StreamReaders, the consumers and the SampleBus subscriptions:
+      - read latency and period jitter of each sensor
+      - SensorConnectionError/InvalidDataError counters of each sensor
+      - health state and reconnect attempts of each sensor
+      - queue dwell time (time between publish and read) and depth of each subscription
+      - batch size and processing time of each consumer
+      - utilization of the I2C bus and transaction time of each device on it
+    """
+
+    def __init__(self):
+        self.sensors = {}
+        self.supervisors = {}
+        self.consumers = {}
+        self.bus = None
+        self.arbiter = None
+
+    def register(self, *readers):
+        """
+        Makes the StreamReaders record the timing of their reads.
+        """
+        for reader in readers:
+            reader.stats = self.sensors.setdefault(reader.config["name"], SensorStats())
+            self.supervisors[reader.config["name"]] = reader.supervisor
+
+    def register_consumers(self, *consumers):
+        """
+        Makes the consumers record the timing of the batches they handle.
+        """
+        for consumer in consumers:
+            consumer.stats = self.consumers.setdefault(type(consumer).__name__, ConsumerStats())
+
+    def register_bus(self, bus):
+        """
+        Makes the subscriptions of the bus record how long samples wait before being read.
+        """
+        self.bus = bus
+        for subscription in bus.subscriptions():
+            subscription.dwell = Histogram()
+
+    def register_arbiter(self, arbiter):
+        """
+        Adds the I2C bus stats of the I2CArbiter to the dumps.
+        """
+        self.arbiter = arbiter
+
+    def dump(self):
+        """
+        Returns:
+            dict: A snapshot of all the stats, safe to serialize with json.
+        """
+        report = {
+            "time": time.monotonic(),
+            "sensors": {name: stats.snapshot() for name, stats in self.sensors.items()},
+            "health": {name: supervisor.snapshot() for name, supervisor in self.supervisors.items()},
+            "consumers": {name: stats.snapshot() for name, stats in self.consumers.items()},
+        }
+        if self.bus is not None:
+            report["subscriptions"] = {
+                subscription.name: {
+                    **subscription.stats(),
+                    "dwell": subscription.dwell.snapshot() if subscription.dwell else None,
+                }
+                for subscription in self.bus.subscriptions()
+            }
+        if self.arbiter is not None:
+            report["i2c"] = self.arbiter.snapshot()
+
+        return report
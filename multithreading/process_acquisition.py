@@ -0,0 +1,232 @@
+"""
+Optional process-isolated acquisition: groups of StreamReaders run in worker processes (each with
+its own GIL and SensorScheduler) and write their samples into shared memory ring buffers, which
+the main process reads without pickling and republishes on its SampleBus.
+"""
+from multiprocessing import get_context
+from multiprocessing.shared_memory import SharedMemory
+from multithreading.sample import Sample
+from multithreading.scheduler import SensorScheduler
+from multithreading.thread import LoopingThread
+from utils import json_default
+import json
+import struct
+
+
+class SharedRing:
+    """
+    Single-producer, single-consumer ring buffer of samples in shared memory.
+
+    Layout: the number of samples written (uint64), then `slots` fixed-size slots. Each slot
+    holds a header (slot sequence number, sample sequence number, monotonic and wall-clock
+    times, priority, payload length) followed by the payload: the sensor name and the JSON
+    encoded values, separated by a null byte.
+
+    The slot sequence number is set to 0 while the slot is being written and to the sample's
+    position in the stream (starting at 1) once it is complete, so the reader can detect slots
+    overwritten while it was copying them.
+    """
+
+    HEADER = struct.Struct("<Q")
+    SLOT_HEADER = struct.Struct("<QQddiI")
+    SLOT_SEQUENCE = struct.Struct("<Q")
+
+    def __init__(self, name=None, slots=256, slot_size=4096):
+        """
+        Args:
+            name (str): The name of an existing ring to attach to. A new ring is created if None.
+            slots (int): The number of samples the ring can hold.
+            slot_size (int): The maximum size of an encoded sample, in bytes.
+        """
+        self.slots = slots
+        self.slot_size = slot_size
+        size = self.HEADER.size + slots * slot_size
+        if name is None:
+            self.memory = SharedMemory(create=True, size=size)
+            self.memory.buf[:size] = bytes(size)
+        else:
+            self.memory = SharedMemory(name=name)
+        self.name = self.memory.name
+        self._buf = self.memory.buf
+        self._written = self.HEADER.unpack_from(self._buf, 0)[0]
+        # samples too large for a slot, never written
+        self.oversized = 0
+
+    def _slot_offset(self, position):
+        return self.HEADER.size + (position % self.slots) * self.slot_size
+
+    def write(self, sample):
+        """
+        Writes a sample, overwriting the oldest one if the ring is full. Producer side only.
+        """
+        payload = sample.sensor.encode() + b"\0" + json.dumps(sample.values, default=json_default).encode()
+        if self.SLOT_HEADER.size + len(payload) > self.slot_size:
+            self.oversized += 1
+            return
+
+        offset = self._slot_offset(self._written)
+        self.SLOT_SEQUENCE.pack_into(self._buf, offset, 0)
+        body = offset + self.SLOT_HEADER.size
+        self._buf[body:body + len(payload)] = payload
+        self.SLOT_HEADER.pack_into(
+            self._buf, offset, 0, sample.sequence, sample.monotonic, sample.timestamp,
+            sample.priority, len(payload)
+        )
+        self._written += 1
+        self.SLOT_SEQUENCE.pack_into(self._buf, offset, self._written)
+        self.HEADER.pack_into(self._buf, 0, self._written)
+
+    def read(self, cursor):
+        """
+        Reads the samples written since `cursor`. Consumer side only.
+
+        Args:
+            cursor (int): The number of samples already read.
+
+        Returns:
+            tuple: The new samples, the new cursor and the number of samples overwritten before
+            they could be read.
+        """
+        written = self.HEADER.unpack_from(self._buf, 0)[0]
+        dropped = 0
+        if written - cursor > self.slots:
+            dropped = written - self.slots - cursor
+            cursor = written - self.slots
+
+        samples = []
+        while cursor < written:
+            offset = self._slot_offset(cursor)
+            cursor += 1
+            _, sequence, monotonic, timestamp, priority, length = self.SLOT_HEADER.unpack_from(
+                self._buf, offset
+            )
+            body = offset + self.SLOT_HEADER.size
+            payload = bytes(self._buf[body:body + length])
+            if self.SLOT_SEQUENCE.unpack_from(self._buf, offset)[0] != cursor:
+                # overwritten by the producer while we were reading it
+                dropped += 1
+                continue
+
+            sensor, values = payload.split(b"\0", 1)
+            samples.append(
+                Sample(sensor.decode(), priority, sequence, monotonic, timestamp, json.loads(values))
+            )
+
+        return samples, cursor, dropped
+
+    def close(self):
+        self._buf.release()
+        self.memory.close()
+
+    def unlink(self):
+        self.memory.unlink()
+
+
+class RingWriter:
+    """
+    Stands in for the SampleBus in a worker process: StreamReaders registered on it write their
+    samples to a SharedRing.
+    """
+
+    def __init__(self, ring):
+        self.ring = ring
+
+    def register(self, *readers):
+        for reader in readers:
+            reader.bus = self
+
+    def publish(self, sample):
+        self.ring.write(sample)
+
+
+def run_worker(ring_name, sensors, stop_event):
+    """
+    Entry point of a worker process: builds the StreamReaders and runs them on a SensorScheduler
+    until `stop_event` is set. Being the only thread writing to the ring, the scheduler keeps
+    it single-producer.
+
+    Args:
+        ring_name (str): The name of the SharedRing to write to.
+        sensors (list): The (StreamReader subclass, config) of each sensor to read.
+        stop_event (multiprocessing.Event): Set by the main process to stop the worker.
+    """
+    ring = SharedRing(ring_name)
+    writer = RingWriter(ring)
+    scheduler = SensorScheduler()
+    for reader_class, config in sensors:
+        reader = reader_class(None, None, None, config)
+        writer.register(reader)
+        scheduler.register(reader)
+
+    scheduler.start()
+    stop_event.wait()
+    scheduler.stop()
+    scheduler.join()
+    ring.close()
+
+
+class ProcessAcquisition(LoopingThread):
+    """
+    Runs groups of sensors in worker processes and republishes their samples in the main process,
+    on the SampleBus and in the SnapshotStore.
+
+    Starting/stopping/joining this thread also starts/stops/joins the worker processes.
+    """
+
+    # how often the rings are checked for new samples
+    POLL_INTERVAL_S = 0.005
+    # workers are spawned rather than forked: the main process already runs threads (and Qt)
+    CONTEXT = get_context("spawn")
+
+    def __init__(self, bus, snapshots, groups):
+        """
+        Args:
+            bus (SampleBus): The bus on which to publish the samples.
+            snapshots (SnapshotStore): The store to update with the samples. Can be None.
+            groups (dict): The (StreamReader subclass, config) of the sensors of each worker, by
+                worker name.
+        """
+        super().__init__()
+        self.bus = bus
+        self.snapshots = snapshots
+        self.groups = groups
+        self.rings = {}
+        self.processes = {}
+        self.dropped = {name: 0 for name in groups}
+        self._stop_workers = self.CONTEXT.Event()
+
+    def start(self):
+        for name, sensors in self.groups.items():
+            ring = SharedRing()
+            self.rings[name] = ring
+            self.processes[name] = self.CONTEXT.Process(
+                target=run_worker, args=(ring.name, sensors, self._stop_workers), name=name, daemon=True
+            )
+            self.processes[name].start()
+
+        super().start()
+
+    def stop(self):
+        super().stop()
+        self._stop_workers.set()
+
+    def join(self):
+        super().join()
+        for process in self.processes.values():
+            process.join()
+        for ring in self.rings.values():
+            ring.close()
+            ring.unlink()
+
+    def run(self):
+        cursors = {name: 0 for name in self.rings}
+        while not self.stopped():
+            for name, ring in self.rings.items():
+                samples, cursors[name], dropped = ring.read(cursors[name])
+                self.dropped[name] += dropped
+                for sample in samples:
+                    if self.snapshots is not None:
+                        self.snapshots.update(sample)
+                    self.bus.publish(sample)
+
+            self.wait(self.POLL_INTERVAL_S)
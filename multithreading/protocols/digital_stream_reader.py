@@ -17,9 +17,8 @@ class DigitalStreamReader(StreamReader):
         self._pin = config["pin"]
         GPIO.setup(self._pin, GPIO.IN)
 
-    def join(self):
+    def close(self):
         """
-        Join the thread and cleanup used pin
+        Cleanup used pin
         """
-        super().join()
-        GPIO.cleanup(self._pins)
+        GPIO.cleanup(self._pin)
@@ -0,0 +1,107 @@
+from concurrent.futures import Future
+from multithreading.instrumentation import Histogram
+from multithreading.thread import LoopingThread
+import threading
+import time
+
+
+class I2CArbiter(LoopingThread):
+    """
+    Runs all the transactions on the shared SMBus from a single thread. The devices (SMBusStreamReaders)
+    submit their transactions and wait for the result; each pass of the arbiter runs every pending
+    transaction back-to-back, so the devices never contend for the bus lock and the bus is used in
+    bursts instead of being interleaved with the rest of the program.
+
+    The arbiter also measures how busy the bus is and how long each device holds it, to tell how
+    close we are to saturating it.
+    """
+
+    def __init__(self):
+        super().__init__()
+        self._pending = []
+        self._pending_changed = threading.Condition()
+
+        self.transaction_time = {}
+        self.pass_size = Histogram(bounds=(1, 2, 4, 8, 16))
+        self.busy_time = 0.0
+        self._created = time.monotonic()
+        self._window = (self._created, 0.0)
+
+    def register(self, *devices):
+        """
+        Makes the SMBusStreamReaders run their transactions through this arbiter.
+        """
+        for device in devices:
+            device.arbiter = self
+            self.transaction_time.setdefault(device.config["name"], Histogram())
+
+    def submit(self, device, transaction):
+        """
+        Queues a transaction to run on the next pass. Once the arbiter is stopped, transactions
+        run right away in the calling thread.
+
+        Args:
+            device (SMBusStreamReader): The device doing the transaction.
+            transaction (callable): The function using the bus, called without arguments.
+
+        Returns:
+            concurrent.futures.Future: The result of the transaction.
+        """
+        future = Future()
+        with self._pending_changed:
+            if not self.stopped():
+                self._pending.append((device, transaction, future))
+                self._pending_changed.notify()
+                return future
+
+        self._run_transaction(device, transaction, future)
+        return future
+
+    def stop(self):
+        with self._pending_changed:
+            super().stop()
+            self._pending_changed.notify()
+
+    def _run_transaction(self, device, transaction, future):
+        start = time.monotonic()
+        try:
+            future.set_result(device.run_transaction(transaction))
+        except Exception as e:
+            future.set_exception(e)
+        duration = time.monotonic() - start
+
+        self.busy_time += duration
+        histogram = self.transaction_time.get(device.config["name"])
+        if histogram is not None:
+            histogram.record(duration)
+
+    def run(self):
+        stopping = False
+        while not stopping:
+            with self._pending_changed:
+                while not self._pending and not self.stopped():
+                    self._pending_changed.wait()
+                transactions, self._pending = self._pending, []
+                stopping = self.stopped()
+
+            if transactions:
+                self.pass_size.record(len(transactions))
+            for device, transaction, future in transactions:
+                self._run_transaction(device, transaction, future)
+
+    def snapshot(self):
+        """
+        Returns:
+            dict: The fraction of the time the bus was in use, since the start and since the last
+            snapshot, the number of transactions run per pass and the transaction time of each
+            device.
+        """
+        now = time.monotonic()
+        window_start, window_busy = self._window
+        self._window = (now, self.busy_time)
+        return {
+            "utilization": self.busy_time / max(now - self._created, 1e-9),
+            "recent_utilization": (self.busy_time - window_busy) / max(now - window_start, 1e-9),
+            "pass_size": self.pass_size.snapshot(),
+            "transaction_time": {name: hist.snapshot() for name, hist in self.transaction_time.items()},
+        }
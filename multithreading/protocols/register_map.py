@@ -0,0 +1,72 @@
+import struct
+
+
+class Field:
+    """
+    A value stored in one or more consecutive registers of an I2C device.
+    """
+
+    def __init__(self, name, register, fmt):
+        """
+        Args:
+            name (str): The name of the value.
+            register (int): The address of its first register.
+            fmt (str): Its `struct` format, e.g. ">H" for a big-endian unsigned 16-bit value. A
+                format with several values (e.g. "<hhh") gives a tuple.
+        """
+        self.name = name
+        self.register = register
+        self.struct = struct.Struct(fmt)
+        self.size = self.struct.size
+
+
+class RegisterMap:
+    """
+    Declarative map of the registers read from a device. Fields in contiguous or nearby registers
+    are merged into blocks, each read with a single I2C transfer, and decoded from the returned
+    buffer without copying it.
+    """
+
+    # Unused registers we would rather read through than start a new transfer. Each transfer costs
+    # the start condition, the address, the register pointer write and the repeated start.
+    MAX_GAP = 4
+
+    def __init__(self, *fields, max_gap=MAX_GAP):
+        """
+        Args:
+            fields (Field): The fields to read.
+            max_gap (int): The largest number of unused registers a block can contain.
+        """
+        self.fields = sorted(fields, key=lambda field: field.register)
+        # (first register, length, fields with their offset in the block)
+        self.blocks = []
+
+        for field in self.fields:
+            if self.blocks:
+                start, length, block_fields = self.blocks[-1]
+                if field.register - (start + length) <= max_gap:
+                    block_fields.append((field, field.register - start))
+                    end = max(start + length, field.register + field.size)
+                    self.blocks[-1] = (start, end - start, block_fields)
+                    continue
+
+            self.blocks.append((field.register, field.size, [(field, 0)]))
+
+    def read(self, device):
+        """
+        Reads all the fields. Must be called with access to the bus (in a bus transaction).
+
+        Args:
+            device (SMBusStreamReader): The device to read from.
+
+        Returns:
+            dict: The value of each field, by name.
+        """
+        values = {}
+        for start, length, block_fields in self.blocks:
+            buffer = memoryview(device.read_transfer(start, length))
+            for field, offset in block_fields:
+                value = field.struct.unpack_from(buffer, offset)
+                values[field.name] = value[0] if len(value) == 1 else value
+
+        return values
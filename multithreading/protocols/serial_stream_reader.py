@@ -1,4 +1,6 @@
 from multithreading.stream_reader import StreamReader
+from sensors.sensor_error import SensorConnectionError
+import asyncio
 import serial
 
 class SerialStreamReader(StreamReader):
@@ -13,11 +15,66 @@ class SerialStreamReader(StreamReader):
             config (dict): The configuration for the sensor (serial port).
         """
         super().__init__(lock, data_queue, log_queue, config)
-        self.ser = serial.Serial(**config['serial'])
-    
-    def join(self):
+
+        # the port is opened by `try_connect()` so a missing device does not prevent startup
+        settings = dict(config['serial'])
+        port = settings.pop('port')
+        self.ser = serial.Serial(None, **settings)
+        self.ser.port = port
+        self.try_connect()
+
+    def try_connect(self):
+        """
+        Opens the serial port if it is not already open.
+        """
+        if self.ser.is_open:
+            return True
+
+        try:
+            self.ser.open()
+        except serial.SerialException:
+            return False
+
+        return True
+
+    def read(self):
+        """
+        Reads the data from the sensor, closing the port if the device was disconnected.
+        """
+        try:
+            return super().read()
+        except serial.SerialException as e:
+            self.ser.close()
+            raise SensorConnectionError from e
+
+    async def wait_next_cycle(self, deadline):
+        """
+        Waits until the serial port has data to read, and no sooner than `read_interval` after the
+        last read: readers that do not drain the port would otherwise find it readable right away
+        and spin the event loop.
+        """
+        if self.is_connected:
+            await self.wait_readable()
+        return await super().wait_next_cycle(deadline)
+
+    async def wait_readable(self):
+        """
+        Waits until data is available on the serial port without polling it.
+        """
+        if self.ser.in_waiting:
+            return
+
+        loop = asyncio.get_running_loop()
+        readable = loop.create_future()
+        fd = self.ser.fileno()
+        loop.add_reader(fd, lambda: readable.done() or readable.set_result(None))
+        try:
+            await readable
+        finally:
+            loop.remove_reader(fd)
+
+    def close(self):
         """
-        Join the thread and close the serial port.
+        Close the serial port.
         """
-        super().join()
-        self.ser.close()
\ No newline at end of file
+        self.ser.close()
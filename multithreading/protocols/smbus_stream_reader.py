@@ -1,12 +1,24 @@
 from config import SMBUS_ID
 from multithreading.stream_reader import StreamReader
+from sensors.sensor_error import SensorConnectionError
+from contextlib import contextmanager
 import threading
 import smbus2
 import time
 
 
 class SMBusStreamReader(StreamReader):
+    # settle time of the registers that need one after being written
     WRITE_DELAY_S = 0.01
+    # settle time (s) to wait after writing each register, by register. Other writes do not wait.
+    SETTLE_DELAYS = {}
+    # registers changed by the device itself (self-clearing bits, triggers): always written and
+    # never cached
+    VOLATILE_REGISTERS = ()
+    # largest read supported by the SMBus block read, longer reads use a combined I2C transfer
+    MAX_BLOCK_LENGTH = 32
+    # largest number of messages in a combined transfer (I2C_RDWR_IOCTL_MAX_MSGS on Linux)
+    MAX_TRANSFER_MESSAGES = 42
 
     _bus_lock = threading.Lock()
     _bus = None
@@ -28,31 +40,161 @@ class SMBusStreamReader(StreamReader):
         
         self.address = config["i2c_address"]
         self.__has_lock = False
+        # last value written to (or read from) each register, by (bank, register)
+        self._shadow = {}
+        # I2CArbiter running the bus transactions, set by `I2CArbiter.register`
+        self.arbiter = None
 
+    @contextmanager
     def acquire_bus_lock(self):
-        try:
-            self.lock.acquire()
+        """
+        Gives this device exclusive access to the bus (shared by all the SMBus devices).
+        """
+        with SMBusStreamReader._bus_lock:
             self.__has_lock = True
-            yield None
-        finally:
-            self.lock.release()
-            self.__has_lock = False
+            try:
+                yield
+            finally:
+                self.__has_lock = False
+
+    def run_transaction(self, transaction):
+        """
+        Runs a transaction right away, in the calling thread.
+        """
+        with self.acquire_bus_lock():
+            return transaction()
+
+    def bus_transaction(self, transaction):
+        """
+        Runs a transaction (a function using `read_*`/`write_*`) with exclusive access to the bus.
+        If an I2CArbiter is registered, the transaction is run by it, along with those of the
+        other devices, and this waits for its result.
+
+        Returns:
+            The value returned by `transaction`. Its exceptions are raised here.
+        """
+        if self.arbiter is None:
+            return self.run_transaction(transaction)
+        return self.arbiter.submit(self, transaction).result()
+
+    def register_bank(self):
+        """
+        Returns:
+            The key of the set of registers currently addressed, for devices sharing an address
+            behind a multiplexer. None for the other devices.
+        """
+        return None
+
+    def invalidate_shadow(self):
+        """
+        Forgets the cached register values, e.g. when the device may have been reset.
+        """
+        self._shadow.clear()
 
     def write_byte(self, register, value):
+        """
+        Writes a register, unless it already holds `value` (see VOLATILE_REGISTERS), then waits
+        for its settle time (see SETTLE_DELAYS).
+
+        Returns:
+            bool: True if the register was written, False if the write was skipped.
+        """
         if not self.__has_lock:
             print("SMBusStreamReader: lock not acquired before using bus")
 
-        SMBusStreamReader._bus.write_byte_data(self.address, register, value)
-        time.sleep(self.WRITE_DELAY_S)
+        key = (self.register_bank(), register)
+        cached = register not in self.VOLATILE_REGISTERS
+        if cached and self._shadow.get(key) == value:
+            return False
+
+        try:
+            SMBusStreamReader._bus.write_byte_data(self.address, register, value)
+        except OSError as e:
+            # the device did not acknowledge: it is unplugged or unpowered and will come back
+            # with its default register values
+            self.invalidate_shadow()
+            raise SensorConnectionError from e
+
+        if cached:
+            self._shadow[key] = value
+        delay = self.SETTLE_DELAYS.get(register)
+        if delay:
+            time.sleep(delay)
+        return True
 
     def read_byte(self, register):
         if not self.__has_lock:
             print("SMBusStreamReader: lock not acquired before using bus")
 
-        return SMBusStreamReader._bus.read_byte_data(self.address, register)
+        try:
+            value = SMBusStreamReader._bus.read_byte_data(self.address, register)
+        except OSError as e:
+            self.invalidate_shadow()
+            raise SensorConnectionError from e
+
+        if register not in self.VOLATILE_REGISTERS:
+            self._shadow[(self.register_bank(), register)] = value
+        return value
 
     def read_block(self, register, length):
         if not self.__has_lock:
             print("SMBusStreamReader: lock not acquired before using bus")
 
-        return SMBusStreamReader._bus.read_i2c_block_data(self.address, register, length)
+        try:
+            return SMBusStreamReader._bus.read_i2c_block_data(self.address, register, length)
+        except OSError as e:
+            self.invalidate_shadow()
+            raise SensorConnectionError from e
+
+    def read_transfer(self, register, length):
+        """
+        Reads `length` consecutive registers in a single transfer: a block read when possible, or
+        a combined write (register pointer) + read I2C message otherwise.
+
+        Returns:
+            bytes: The content of the registers.
+        """
+        if length <= self.MAX_BLOCK_LENGTH:
+            return bytes(self.read_block(register, length))
+
+        if not self.__has_lock:
+            print("SMBusStreamReader: lock not acquired before using bus")
+
+        write = smbus2.i2c_msg.write(self.address, [register])
+        read = smbus2.i2c_msg.read(self.address, length)
+        try:
+            SMBusStreamReader._bus.i2c_rdwr(write, read)
+        except OSError as e:
+            self.invalidate_shadow()
+            raise SensorConnectionError from e
+        return bytes(read)
+
+    def read_repeated(self, register, length, count):
+        """
+        Reads the same `length` registers `count` times, e.g. to drain a FIFO, with as few combined
+        transfers as possible (a register pointer write + read message pair per read).
+
+        Returns:
+            bytes: The content of the registers for each read, concatenated.
+        """
+        if not self.__has_lock:
+            print("SMBusStreamReader: lock not acquired before using bus")
+
+        data = []
+        reads_per_transfer = self.MAX_TRANSFER_MESSAGES // 2
+        for start in range(0, count, reads_per_transfer):
+            reads = [
+                smbus2.i2c_msg.read(self.address, length)
+                for _ in range(min(reads_per_transfer, count - start))
+            ]
+            messages = []
+            for read in reads:
+                messages += [smbus2.i2c_msg.write(self.address, [register]), read]
+            try:
+                SMBusStreamReader._bus.i2c_rdwr(*messages)
+            except OSError as e:
+                self.invalidate_shadow()
+                raise SensorConnectionError from e
+            data += [bytes(read) for read in reads]
+
+        return b"".join(data)
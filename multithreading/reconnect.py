@@ -0,0 +1,87 @@
+import random
+import time
+
+# Health states of a sensor
+CONNECTED = "connected"
+DEGRADED = "degraded"  # connected, but the last reads returned invalid data
+DISCONNECTED = "disconnected"
+
+
+class ReconnectSupervisor:
+    """
+    Decides when a StreamReader may try to reconnect to its sensor and tracks its health.
+
+    After each failed attempt, the delay before the next one doubles (up to `MAX_DELAY_S`), with
+    some random jitter so sensors sharing a bus do not all retry at the same time. This keeps an
+    unplugged sensor from spinning its thread and hammering the bus.
+    """
+
+    INITIAL_DELAY_S = 0.5
+    MAX_DELAY_S = 30
+    BACKOFF_FACTOR = 2
+    JITTER = 0.2  # +/- 20% of the delay
+    # Number of consecutive invalid reads after which a connected sensor is considered degraded
+    DEGRADED_AFTER = 3
+
+    def __init__(self, config=None):
+        """
+        Args:
+            config (dict): Optional overrides of the class constants, e.g. {"MAX_DELAY_S": 60}.
+        """
+        for key, value in (config or {}).items():
+            setattr(self, key, value)
+
+        self.state = DISCONNECTED
+        self.attempts = 0  # total number of connection attempts
+        self.failures = 0  # consecutive failed attempts
+        self.invalid_reads = 0  # consecutive invalid reads
+        self.next_attempt = 0.0
+
+    def can_attempt(self, now):
+        return now >= self.next_attempt
+
+    def retry_delay(self):
+        """
+        Returns:
+            float: The number of seconds until the next connection attempt is allowed.
+        """
+        return max(0.0, self.next_attempt - time.monotonic())
+
+    def connection_attempted(self, success, now):
+        """
+        Records the result of a call to `try_connect()`.
+        """
+        self.attempts += 1
+        if success:
+            self.state = CONNECTED
+            self.failures = 0
+            self.invalid_reads = 0
+            return
+
+        self.state = DISCONNECTED
+        self.failures += 1
+        delay = min(self.MAX_DELAY_S, self.INITIAL_DELAY_S * self.BACKOFF_FACTOR ** (self.failures - 1))
+        self.next_attempt = now + delay * random.uniform(1 - self.JITTER, 1 + self.JITTER)
+
+    def connection_lost(self, now):
+        """
+        Records the loss of a connected sensor. The first reconnection attempt is immediate.
+        """
+        self.state = DISCONNECTED
+        self.next_attempt = now
+
+    def read_succeeded(self):
+        self.invalid_reads = 0
+        self.state = CONNECTED
+
+    def read_invalid(self):
+        self.invalid_reads += 1
+        if self.invalid_reads >= self.DEGRADED_AFTER:
+            self.state = DEGRADED
+
+    def snapshot(self):
+        return {
+            "state": self.state,
+            "attempts": self.attempts,
+            "failures": self.failures,
+        }
@@ -0,0 +1,33 @@
+class Sample:
+    """
+    A single reading of a sensor, as it travels through the whole pipeline (bus, queues,
+    consumers, snapshots). Uses `__slots__` to keep the per-sample allocation small.
+
+    Samples are ordered by priority, then by read time, so they can be put directly in a
+    PriorityQueue. A sample must not be modified once published.
+    """
+
+    __slots__ = ("sensor", "priority", "sequence", "monotonic", "timestamp", "values")
+
+    def __init__(self, sensor, priority, sequence, monotonic, timestamp, values):
+        """
+        Args:
+            sensor (str): The name of the sensor (`config["name"]`).
+            priority (int): The priority of the sensor, lower is processed first.
+            sequence (int): The number of samples read from this sensor, starting at 1.
+            monotonic (float): The `time.monotonic()` time of the read.
+            timestamp (float): The wall-clock (`time.time()`) time of the read.
+            values: The data returned by the sensor's `read_raw_data()`.
+        """
+        self.sensor = sensor
+        self.priority = priority
+        self.sequence = sequence
+        self.monotonic = monotonic
+        self.timestamp = timestamp
+        self.values = values
+
+    def __lt__(self, other):
+        return (self.priority, self.monotonic) < (other.priority, other.monotonic)
+
+    def __repr__(self):
+        return f"Sample({self.sensor} #{self.sequence} at {self.monotonic:.3f}: {self.values})"
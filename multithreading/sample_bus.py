@@ -0,0 +1,288 @@
+from collections import deque
+from queue import Empty
+import threading
+import time
+
+
+# Overflow policies of a subscription, applied when a sample is published while its ring buffer
+# is full (or, for COALESCE, whenever a sample of the same sensor is still waiting)
+BLOCK = "block"  # wait until the subscriber reads a sample
+DROP_OLDEST = "drop_oldest"  # overwrite the oldest sample
+COALESCE = "coalesce"  # only keep the newest sample of each sensor
+
+OVERFLOW_POLICIES = (BLOCK, DROP_OLDEST, COALESCE)
+
+
+class Subscription:
+    """
+    A subscriber's view of the SampleBus: a bounded ring buffer of the samples published since the
+    subscriber last read it. What happens when the subscriber falls behind is decided by its
+    overflow policy, which can be overriden for specific sensors. With DROP_OLDEST and COALESCE, a
+    slow subscriber never blocks the producers or the other subscribers.
+
+    Samples are read in publish order, or with `prioritized`, lowest `priority` first (like the
+    PriorityQueue the checks used to read from), in publish order among the same priority.
+
+    It has the same `get()`/`task_done()` interface as `queue.Queue` so consumers can use either.
+    Consumers that cannot wait on its lock, like the coroutines of an AsyncRuntime, `listen()` to
+    it instead.
+    """
+
+    def __init__(self, name, capacity, sensors=None, policy=DROP_OLDEST, sensor_policies=None,
+                 prioritized=False):
+        """
+        Args:
+            name (str): The name of the subscriber, used to report its lag.
+            capacity (int): The maximum number of samples kept in the ring buffer.
+            sensors (iterable): The names of the sensors to receive. All sensors if None.
+            policy (str): The overflow policy, one of `OVERFLOW_POLICIES`.
+            sensor_policies (dict): Overflow policies for specific sensors, by sensor name.
+            prioritized (bool): Whether samples with a lower priority value are read first.
+        """
+        self.name = name
+        self.capacity = capacity
+        self.sensors = None if sensors is None else frozenset(sensors)
+        self.policy = policy
+        self.sensor_policies = dict(sensor_policies or {})
+        self.prioritized = prioritized
+        for p in (policy, *self.sensor_policies.values()):
+            if p not in OVERFLOW_POLICIES:
+                raise ValueError(f"Unknown overflow policy: {p}")
+
+        # entries are (sensor name, None, None) for coalesced samples, which are kept in
+        # `_latest` with their publish time, and (None, item, publish time) for all the others
+        self._ring = deque()
+        self._latest = {}
+        lock = threading.Lock()
+        self._not_empty = threading.Condition(lock)
+        self._not_full = threading.Condition(lock)
+
+        # number of samples published to, read from and discarded by this subscription
+        self.published = 0
+        self.consumed = 0
+        self.dropped = 0
+        self.coalesced = 0
+        # Histogram of the time spent by samples in the ring buffer, set by `Instrumentation`
+        self.dwell = None
+        self._listeners = ()
+
+    def listen(self, callback):
+        """
+        Makes `callback()` be called, from the publishing thread, each time a sample is added to
+        the ring buffer.
+        """
+        self._listeners = self._listeners + (callback,)
+
+    def accepts(self, name):
+        return self.sensors is None or name in self.sensors
+
+    def policy_for(self, name):
+        return self.sensor_policies.get(name, self.policy)
+
+    def push(self, item):
+        """
+        Adds a sample to the ring buffer according to the overflow policy of its sensor. Only
+        blocks with the BLOCK policy.
+        """
+        name = item.sensor
+        policy = self.policy_for(name)
+        published_at = time.monotonic()
+
+        with self._not_empty:
+            self.published += 1
+            while True:
+                if policy == COALESCE and name in self._latest:
+                    # replace the waiting sample, keeping its place in the ring
+                    self._latest[name] = (item, published_at)
+                    self.coalesced += 1
+                    return
+
+                if len(self._ring) < self.capacity:
+                    break
+                # samples of BLOCK sensors are never discarded to make room, not even for others
+                if policy == BLOCK or not self._discard_oldest():
+                    self._not_full.wait()
+
+            if policy == COALESCE:
+                self._ring.append((name, None, None))
+                self._latest[name] = (item, published_at)
+            else:
+                self._ring.append((None, item, published_at))
+
+            self._not_empty.notify()
+
+        for callback in self._listeners:
+            callback()
+
+    def _discard_oldest(self):
+        """
+        Discards the oldest sample whose sensor's policy allows dropping it.
+
+        Returns:
+            bool: False if all the waiting samples are under the BLOCK policy.
+        """
+        for index, (key, item, _) in enumerate(self._ring):
+            if self.policy_for(item.sensor if key is None else key) != BLOCK:
+                del self._ring[index]
+                if key is not None:
+                    del self._latest[key]
+                self.dropped += 1
+                return True
+        return False
+
+    def _entry_priority(self, entry):
+        key, item, _ = entry
+        return (self._latest[key][0] if key is not None else item).priority
+
+    def _next_index(self):
+        """
+        Returns:
+            int: The position in the ring of the next entry to read.
+        """
+        if not self.prioritized:
+            return 0
+        return min(range(len(self._ring)), key=lambda i: self._entry_priority(self._ring[i]))
+
+    def _pop(self, now, index=0):
+        if index == 0:
+            key, item, published_at = self._ring.popleft()
+        else:
+            key, item, published_at = self._ring[index]
+            del self._ring[index]
+        if key is not None:
+            item, published_at = self._latest.pop(key)
+        if self.dwell is not None:
+            self.dwell.record(now - published_at)
+        return item
+
+    def get(self, block=True, timeout=None):
+        """
+        Removes and returns the next item of the ring buffer.
+
+        Raises:
+            queue.Empty: If no item is available (after `timeout` seconds if `block` is True).
+        """
+        with self._not_empty:
+            if not self._ring:
+                if not block or not self._not_empty.wait_for(lambda: self._ring, timeout):
+                    raise Empty
+
+            item = self._pop(time.monotonic(), self._next_index())
+            self.consumed += 1
+            self._not_full.notify()
+            return item
+
+    def get_batch(self, max_items, timeout=None):
+        """
+        Waits for an item, then removes and returns all the items available (up to `max_items`)
+        with a single lock acquisition.
+
+        Returns:
+            list: The next items of the ring buffer, in reading order. Empty if no item arrived
+            within `timeout`.
+        """
+        with self._not_empty:
+            if not self._ring and not self._not_empty.wait_for(lambda: self._ring, timeout):
+                return []
+
+            now = time.monotonic()
+            if self.prioritized:
+                # stable sort: publish order is kept among the same priority
+                self._ring = deque(sorted(self._ring, key=self._entry_priority))
+            items = []
+            while self._ring and len(items) < max_items:
+                items.append(self._pop(now))
+
+            self.consumed += len(items)
+            self._not_full.notify(len(items))
+            return items
+
+    def task_done(self):
+        # nothing to do, only there to match the `queue.Queue` interface
+        pass
+
+    @property
+    def lag(self):
+        """
+        Returns:
+            int: The number of samples waiting to be read. Samples discarded before being read
+            are counted in `dropped` and `coalesced` instead.
+        """
+        return len(self._ring)
+
+    def stats(self):
+        return {
+            "published": self.published,
+            "consumed": self.consumed,
+            "dropped": self.dropped,
+            "coalesced": self.coalesced,
+            "lag": self.lag,
+        }
+
+
+class SampleBus:
+    """
+    Fan-out bus between the StreamReaders (producers) and the consumers (checks, telemetry, GUI,
+    logging). A sample is published once and copied by reference into the ring buffer of every
+    interested subscriber.
+
+    There is no global lock on the publish path: the subscription list is replaced (never
+    mutated) when a subscriber is added, and each ring buffer has its own short-lived lock.
+    """
+
+    def __init__(self):
+        self._subscriptions = ()
+        self._subscribe_lock = threading.Lock()
+
+    def subscribe(self, name, capacity=100, sensors=None, policy=DROP_OLDEST, sensor_policies=None,
+                  prioritized=False):
+        """
+        Adds a subscriber to the bus.
+
+        Args:
+            name (str): The name of the subscriber.
+            capacity (int): The size of the subscriber's ring buffer.
+            sensors (iterable): The names of the sensors to receive. All sensors if None.
+            policy (str): What to do when the subscriber falls behind, one of `OVERFLOW_POLICIES`.
+            sensor_policies (dict): Overflow policies for specific sensors, by sensor name.
+            prioritized (bool): Whether samples with a lower priority value are read first.
+
+        Returns:
+            Subscription: The subscription from which the subscriber reads the samples.
+        """
+        subscription = Subscription(name, capacity, sensors, policy, sensor_policies, prioritized)
+        with self._subscribe_lock:
+            self._subscriptions = self._subscriptions + (subscription,)
+
+        return subscription
+
+    def subscriptions(self):
+        return self._subscriptions
+
+    def register(self, *readers):
+        """
+        Makes the StreamReaders publish their samples on this bus instead of their queues.
+        """
+        for reader in readers:
+            reader.bus = self
+
+    def publish(self, sample):
+        """
+        Publishes a sample to all the interested subscribers.
+
+        Args:
+            sample (Sample): The sample to publish.
+        """
+        for subscription in self._subscriptions:
+            if subscription.accepts(sample.sensor):
+                subscription.push(sample)
+
+    def lag(self):
+        """
+        Returns:
+            dict: The lag of each subscriber, in number of samples.
+        """
+        return {subscription.name: subscription.lag for subscription in self._subscriptions}
+
+    def stats(self):
+        return {subscription.name: subscription.stats() for subscription in self._subscriptions}
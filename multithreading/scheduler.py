@@ -0,0 +1,108 @@
+from multithreading.thread import LoopingThread
+import heapq
+import time
+
+
+class SensorScheduler(LoopingThread):
+    """
+    Runs many StreamReaders from a single thread instead of one thread per reader.
+
+    Readers are kept in a heap ordered by their next deadline (monotonic clock). Deadlines advance
+    by exactly `read_interval` at each run, so the time spent reading a sensor does not make its
+    period drift. When a reader falls behind by more than one period, the missed cycles are
+    skipped (not run back-to-back) and counted in `missed_deadlines`.
+
+    Readers with very different timing needs (e.g. slow serial devices and the IMU) can be split
+    between a few schedulers to form a small pool of worker threads.
+
+    The readers are closed when the scheduler stops.
+    """
+
+    def __init__(self):
+        super().__init__()
+        self._heap = []
+        self._order = 0
+        self.readers = []
+        self.runs = {}
+        self.missed_deadlines = {}
+
+    def register(self, *readers):
+        """
+        Adds readers to the scheduler. Must be called before `start()`.
+
+        Args:
+            *readers (StreamReader): The readers to run. Their `step()` method will be called
+                every `read_interval` seconds.
+        """
+        now = time.monotonic()
+        for reader in readers:
+            name = reader.config["name"]
+            self.readers.append(reader)
+            self.runs[name] = 0
+            self.missed_deadlines[name] = 0
+            self._push(now, reader)
+
+    def report(self):
+        """
+        Returns:
+            dict: For each sensor name, the number of cycles run and the number of deadlines
+            missed since the scheduler started.
+        """
+        return {
+            name: {"runs": self.runs[name], "missed": self.missed_deadlines[name]}
+            for name in self.runs
+        }
+
+    def _push(self, deadline, reader):
+        # the counter breaks ties between equal deadlines so readers are never compared
+        heapq.heappush(self._heap, (deadline, self._order, reader))
+        self._order += 1
+
+    def _next_deadline(self, reader, deadline, now):
+        if not reader.is_connected:
+            # retry when the reconnect backoff allows it
+            return max(now, reader.supervisor.next_attempt)
+
+        period = reader.read_interval
+        if period <= 0:
+            # no fixed rate: run again as soon as the other due readers had their turn
+            return now
+
+        deadline += period
+        if deadline <= now:
+            missed = int((now - deadline) // period) + 1
+            self.missed_deadlines[reader.config["name"]] += missed
+            deadline += missed * period
+
+        return deadline
+
+    def run(self):
+        """
+        Runs the readers as their deadlines expire until the scheduler is stopped, then closes
+        them.
+        """
+        try:
+            self._run_readers()
+        finally:
+            for reader in self.readers:
+                try:
+                    reader.close()
+                except Exception as e:
+                    print(f"SensorScheduler: {reader.config['name']}: could not close: {e}")
+
+    def _run_readers(self):
+        while self._heap and not self.stopped():
+            deadline, _, reader = heapq.heappop(self._heap)
+
+            delay = deadline - time.monotonic()
+            if delay > 0 and self.wait(delay):
+                break
+
+            try:
+                reader.step()
+            except Exception as e:
+                # one faulty sensor must not stop all the others
+                print(f"SensorScheduler: {reader.config['name']}: {e}")
+
+            self.runs[reader.config["name"]] += 1
+            self._push(self._next_deadline(reader, deadline, time.monotonic()), reader)
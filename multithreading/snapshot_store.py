@@ -0,0 +1,55 @@
+import threading
+
+
+class SnapshotStore:
+    """
+    Keeps the latest Sample of every sensor, by sensor name (`config["name"]`). Samples carry
+    their monotonic timestamp and sequence number, so readers can tell how fresh a value is and
+    whether it changed since they last looked.
+
+    The store is copy-on-write: each update builds a new dict of (immutable) samples and swaps it
+    in, so readers never take a lock and `snapshot()` gives a consistent view of all the sensors
+    in constant time. Only the (rare, short) writes are serialized.
+    """
+
+    def __init__(self):
+        self._samples = {}
+        self._write_lock = threading.Lock()
+
+    def register(self, *readers):
+        """
+        Makes the StreamReaders update this store with every sample they read.
+        """
+        for reader in readers:
+            reader.snapshots = self
+
+    def update(self, sample):
+        """
+        Stores the latest sample read from a sensor.
+        """
+        with self._write_lock:
+            samples = dict(self._samples)
+            samples[sample.sensor] = sample
+            self._samples = samples
+
+    def get(self, name):
+        """
+        Returns:
+            Sample: The latest sample of the sensor, or None if it was never read.
+        """
+        return self._samples.get(name)
+
+    def value(self, name, default=None):
+        """
+        Returns:
+            The latest values read from the sensor, or `default` if it was never read.
+        """
+        sample = self._samples.get(name)
+        return default if sample is None else sample.values
+
+    def snapshot(self):
+        """
+        Returns:
+            dict: The latest sample of every sensor, by name. Must not be modified.
+        """
+        return self._samples
@@ -0,0 +1,61 @@
+from multithreading.consumers import Consumer
+from multithreading.sample import Sample
+from multithreading.sample_bus import DROP_OLDEST
+import time
+
+
+class Stage(Consumer):
+    """
+    A processing stage of the pipeline: consumes the samples of some sensors from its own
+    SampleBus subscription and publishes what it derives from them as a new sensor stream, on the
+    same bus (and in the SnapshotStore), like a StreamReader would.
+
+    Child classes implement `process_batch()` and call `publish()` with their results. An error
+    while processing a batch is printed and counted in `errors`: it only loses that batch, the stage
+    keeps running.
+    """
+
+    def __init__(self, bus, config, sensors):
+        """
+        Args:
+            bus (SampleBus): The bus to read the input samples from and publish the results on.
+            config (dict): The configuration of the stage: "name" and "priority" of its output
+                stream and optionally "capacity" and "policy" of its subscription.
+            sensors (iterable): The names of the sensors consumed by the stage.
+        """
+        subscription = bus.subscribe(
+            config["name"], capacity=config.get("capacity", 100), sensors=sensors,
+            policy=config.get("policy", DROP_OLDEST)
+        )
+        super().__init__(None, subscription)
+        self.config = config
+        self.bus = bus
+        self.priority = config["priority"]
+        self.sequence = 0
+        self.errors = 0
+        # set by `SnapshotStore.register()`
+        self.snapshots = None
+
+    def timed_process_batch(self, items):
+        try:
+            super().timed_process_batch(items)
+        except Exception as e:
+            self.errors += 1
+            print(f"{self.config['name']}: failed to process a batch of {len(items)} samples: {e!r}")
+
+    def publish(self, values, monotonic=None):
+        """
+        Publishes a result of the stage as a sample of its stream.
+
+        Args:
+            values: The values of the sample.
+            monotonic (float): The monotonic time the values refer to. Now if None.
+        """
+        self.sequence += 1
+        sample = Sample(
+            self.config["name"], self.priority, self.sequence,
+            time.monotonic() if monotonic is None else monotonic, time.time(), values
+        )
+        if self.snapshots is not None:
+            self.snapshots.update(sample)
+        self.bus.publish(sample)
@@ -1,5 +1,9 @@
 from multithreading.thread import LoopingThread
+from multithreading.reconnect import ReconnectSupervisor
+from multithreading.adaptive import AdaptiveRate
+from multithreading.sample import Sample
 from sensors.sensor_error import *
+import asyncio
 import time
 
 class StreamReader(LoopingThread):
@@ -7,6 +11,10 @@ class StreamReader(LoopingThread):
     This class is used to read a stream of data from a sensor and put it in a queue
     on a new thread. The data is read at a specified interval on a new thread.
     It is a data producer.
+
+    A StreamReader can also be driven by a `SensorScheduler` instead of its own thread, in which
+    case `step()` is called by the scheduler, or by an `AsyncRuntime` through `run_async()`. In
+    both cases `start()` must not be called, and the runtime calls `close()` when it stops.
     """
     def __init__(self, lock, data_queue, log_queue, config):
         super(StreamReader, self).__init__()
@@ -16,18 +24,110 @@ class StreamReader(LoopingThread):
         self.read_interval = self.config["read_interval"]
         self.data_queue = data_queue
         self.log_queue = log_queue
+        # set by `SampleBus.register()`, replaces the queues
+        self.bus = None
+        # set by `SnapshotStore.register()`
+        self.snapshots = None
+        # set by `Instrumentation.register()`
+        self.stats = None
+
+        # number of samples read from the sensor
+        self.sequence = 0
 
         # connection status
         self.is_connected = False
-    
+        self.supervisor = ReconnectSupervisor(self.config.get("reconnect"))
+
+        # adaptive sampling: `read_interval` follows the dynamics of the values returned by
+        # `monitored_values()`
+        self.adaptive = AdaptiveRate(self.config["adaptive"]) if "adaptive" in self.config else None
+
     def read(self):
         """
         Reads the data from the sensor with name
 
         Returns:
-            tuple: The name of the sensor and the data from the sensor.
+            Sample: The data from the sensor, timestamped.
         """
-        return self.config["name"], self.read_raw_data()
+        values = self.read_raw_data()
+        self.sequence += 1
+        return Sample(
+            self.config["name"], self.priority, self.sequence, time.monotonic(), time.time(), values
+        )
+
+    def acquire(self):
+        """
+        Connects to the sensor if needed, then reads it.
+
+        Returns:
+            Sample: The data from the sensor, or None if nothing could be read during this cycle.
+        """
+        if not self.is_connected:
+            now = time.monotonic()
+            if self.supervisor.can_attempt(now):
+                self.is_connected = self.try_connect()
+                self.supervisor.connection_attempted(self.is_connected, now)
+            return None
+
+        start = time.monotonic()
+        try:
+            sample = self.read()
+        except SensorConnectionError:
+            self.is_connected = False
+            self.supervisor.connection_lost(time.monotonic())
+            if self.stats is not None:
+                self.stats.connection_errors += 1
+            return None
+        except InvalidDataError:
+            self.supervisor.read_invalid()
+            if self.stats is not None:
+                self.stats.invalid_data += 1
+            return None
+
+        self.supervisor.read_succeeded()
+
+        if self.stats is not None:
+            self.stats.record_read(start, sample.monotonic, self.read_interval)
+
+        if self.adaptive is not None:
+            self.read_interval = self.adaptive.next_interval(
+                self.monitored_values(sample.values), sample.monotonic
+            )
+
+        if self.snapshots is not None:
+            self.snapshots.update(sample)
+
+        return sample
+
+    def publish(self, sample):
+        """
+        Publishes the sample on the SampleBus, or puts it in the data and log queues if the
+        reader is not registered on a bus.
+        """
+        if self.bus is not None:
+            self.bus.publish(sample)
+        elif self.lock:
+            with self.lock:
+                self.data_queue.put(sample)
+                self.log_queue.put(sample)
+        else:
+            self.data_queue.put(sample)
+            self.log_queue.put(sample)
+
+    def step(self):
+        """
+        Runs a single acquisition cycle: reads the sensor (if connected) and puts the data in the
+        queues.
+
+        Returns:
+            bool: True if data was read, False otherwise.
+        """
+        sample = self.acquire()
+        if sample is None:
+            return False
+
+        self.publish(sample)
+        return True
 
     def run(self):
         """
@@ -35,31 +135,82 @@ class StreamReader(LoopingThread):
         """
         while not self.stopped():
             if not self.is_connected:
-                self.is_connected = self.try_connect()
+                self.acquire()
+                if not self.is_connected:
+                    # wait for the reconnect backoff instead of spinning
+                    self.wait(self.supervisor.retry_delay())
                 continue
 
-            try:
-                data = self.read()
+            self.step()
+            time.sleep(self.read_interval)
 
-                if self.lock:
-                    with self.lock:
-                        self.data_queue.put((self.priority, data))
-                        self.log_queue.put(data)
-                else:
-                    self.data_queue.put((self.priority, data))
-                    self.log_queue.put(data)
+    async def run_async(self, executor):
+        """
+        Coroutine equivalent of `run()` used by the AsyncRuntime. Each cycle runs in `executor`,
+        like `step()`: blocking reads do not stall the event loop, and neither does a BLOCK
+        subscription making the publish wait for its consumer.
+        """
+        loop = asyncio.get_running_loop()
+        deadline = time.monotonic()
+        while not self.stopped():
+            await loop.run_in_executor(executor, self.step)
+            deadline = await self.wait_next_cycle(deadline)
 
-            except SensorConnectionError:
-                self.is_connected = False
-            except InvalidDataError:
-                pass
+    async def wait_next_cycle(self, deadline):
+        """
+        Waits until the next read is due. By default, reads happen at a fixed rate of
+        `read_interval` seconds.
 
-            time.sleep(self.read_interval)
+        Args:
+            deadline (float): The monotonic time at which the last read was due.
+
+        Returns:
+            float: The monotonic time at which the next read is due.
+        """
+        if not self.is_connected:
+            await asyncio.sleep(self.supervisor.retry_delay())
+            return time.monotonic()
+
+        deadline += self.read_interval
+        delay = deadline - time.monotonic()
+        if delay <= 0:
+            # we are late: do not try to catch up on the missed reads
+            return time.monotonic()
+
+        await asyncio.sleep(delay)
+        return deadline
 
     def read_raw_data(self):
         # Should be overriden by child class
         return 0
 
+    def close(self):
+        """
+        Releases what the reader holds (ports, GPIO events, background threads) once it is not
+        read anymore. To be overriden by child classes holding such resources.
+        """
+        pass
+
+    def join(self, timeout=None):
+        """
+        Join the thread and close the reader.
+        """
+        super().join(timeout)
+        self.close()
+
+    def monitored_values(self, data):
+        """
+        Gives the values that drive the adaptive read interval. To be overriden by child classes
+        that support adaptive sampling.
+
+        Args:
+            data: The data returned by `read_raw_data()`.
+
+        Returns:
+            iterable: (key, value, warning threshold or None) tuples.
+        """
+        return ()
+
     def try_connect(self):
         # To be overriden by child class which need some form of connection with the
         # sensor. Returns True by default (no connection required in some cases)
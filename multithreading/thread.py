@@ -11,17 +11,28 @@ class LoopingThread(threading.Thread):
     """
     def __init__(self):
         threading.Thread.__init__(self)
-        self._stop = threading.Event()
+        # NOTE: must not be named `_stop`, which would shadow `threading.Thread._stop` and break
+        # `join()` on Python 3
+        self._stop_event = threading.Event()
 
     def stop(self):
         """
         Sends a stop signal to the thread.
         """
-        self._stop.set()
+        self._stop_event.set()
 
     def stopped(self):
         """
         Returns:
             bool: True if the thread is stopped, False otherwise.
         """
-        return self._stop.isSet()
+        return self._stop_event.is_set()
+
+    def wait(self, timeout):
+        """
+        Sleeps for `timeout` seconds, waking up early if the thread is stopped.
+
+        Returns:
+            bool: True if the thread was stopped during the wait, False otherwise.
+        """
+        return self._stop_event.wait(timeout)
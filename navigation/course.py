@@ -0,0 +1,250 @@
+"""
+Race course timing: lap counting, split times and distance to the next buoy, from the GPS fixes.
+
+The course is a JSON file listing the gates in the order they must be crossed, the first one being
+the start/finish line. Each gate is the segment between two buoys, named as seen from a boat
+crossing it in the race direction: the "left" buoy to port, the "right" one to starboard.
+    {
+        "laps": 3,
+        "gates": [
+            {"name": "start", "left": [45.5017, -73.5673], "right": [45.5019, -73.5670]},
+            {"name": "buoy 1", "left": [45.5051, -73.5602], "right": [45.5053, -73.5599]}
+        ]
+    }
+"""
+from multithreading.stage import Stage
+from config import CONFIG
+import numpy as np
+import json
+import math
+
+EARTH_RADIUS_M = 6371000
+SECONDS_PER_DAY = 86400
+
+
+class Course:
+    """
+    The gates of a course, projected on a local equirectangular frame (m) centered on the course,
+    where a race area is small enough to be considered flat.
+
+    The gates are registered in a grid of square cells, so the gates crossed by a move are found
+    by checking only the gates of the few cells the move covers. A gate only counts when crossed in
+    the race direction, with its left buoy to port.
+    """
+
+    def __init__(self, gates, laps, cell_size):
+        """
+        Args:
+            gates (list): The {"name", "left", "right"} gates, in order, buoys in (lat, long) degrees.
+            laps (int): The number of laps of the race.
+            cell_size (float): The size of the grid cells (m), larger than the distance travelled
+                between two fixes.
+        """
+        self.names = [gate["name"] for gate in gates]
+        self.laps = laps
+        self.cell_size = cell_size
+
+        buoys = np.array([[gate["left"], gate["right"]] for gate in gates], dtype=float)
+        self.origin = buoys.reshape(-1, 2).mean(axis=0)
+        # m per degree of latitude and longitude around the origin
+        self.scale = np.radians([EARTH_RADIUS_M, EARTH_RADIUS_M * math.cos(math.radians(self.origin[0]))])
+
+        # segment of each gate: start and vector to the end, in (north, east) m
+        left = self.project(buoys[:, 0])
+        right = self.project(buoys[:, 1])
+        self.starts = left
+        self.vectors = right - left
+        self.middles = (left + right) / 2
+
+        self.grid = {}
+        for gate, (start, end) in enumerate(zip(left, right)):
+            for cell in self._cells(start, end):
+                self.grid.setdefault(cell, []).append(gate)
+
+    @classmethod
+    def load(cls, path, cell_size):
+        """
+        Loads a course file.
+        """
+        with open(path) as file:
+            course = json.load(file)
+        return cls(course["gates"], course["laps"], cell_size)
+
+    def project(self, positions):
+        """
+        Args:
+            positions (np.ndarray): (lat, long) degrees, of shape (2,) or (n, 2).
+
+        Returns:
+            np.ndarray: The (north, east) positions (m) in the course frame.
+        """
+        return (np.asarray(positions, dtype=float) - self.origin) * self.scale
+
+    def _cells(self, a, b):
+        """
+        Returns:
+            list: The grid cells covered by the bounding box of the segment between `a` and `b`.
+        """
+        low = np.floor(np.minimum(a, b) / self.cell_size).astype(int)
+        high = np.floor(np.maximum(a, b) / self.cell_size).astype(int)
+        return [(i, j) for i in range(low[0], high[0] + 1) for j in range(low[1], high[1] + 1)]
+
+    def crossings(self, a, b):
+        """
+        Finds the gates crossed by a move.
+
+        Args:
+            a (np.ndarray): The (north, east) start of the move (m).
+            b (np.ndarray): The (north, east) end of the move (m).
+
+        Returns:
+            list: The (fraction of the move where the gate is crossed, gate index), in order. Gates
+            crossed backwards are left out.
+        """
+        gates = set()
+        for cell in self._cells(a, b):
+            gates.update(self.grid.get(cell, ()))
+
+        move = b - a
+        crossings = []
+        for gate in gates:
+            vector = self.vectors[gate]
+            # cross product of the move and the gate (left to right buoy), in (north, east): positive
+            # when the left buoy is to port, i.e. in the race direction
+            denominator = move[0] * vector[1] - move[1] * vector[0]
+            if denominator <= 0:
+                # backwards (e.g. milling around before the start) or parallel
+                continue
+            offset = self.starts[gate] - a
+            along_move = (offset[0] * vector[1] - offset[1] * vector[0]) / denominator
+            along_gate = (offset[0] * move[1] - offset[1] * move[0]) / denominator
+            if 0 <= along_move <= 1 and 0 <= along_gate <= 1:
+                crossings.append((along_move, gate))
+        return sorted(crossings)
+
+    def distance_to_gate(self, position, gate):
+        """
+        Returns:
+            float: The distance (m) from a (north, east) position to the middle of a gate.
+        """
+        return float(np.hypot(*(self.middles[gate] - position)))
+
+
+class CourseTiming(Stage):
+    """
+    Follows the boat along the course and publishes the "COURSE" stream: laps, split times of the
+    current lap (s, from the start of the lap to each gate), last lap time and distance to the next
+    gate. Gates must be crossed in order; the crossing time is interpolated between the two fixes,
+    on the time the receiver took them (their NMEA time) rather than the time they were read.
+    """
+
+    def __init__(self, bus, config):
+        self.gps = CONFIG["GPS"]["name"]
+        super().__init__(bus, config, (self.gps,))
+
+        self.course = Course.load(config["file"], config["cell_size_m"])
+        # same jump rejection as the odometry
+        self.max_speed = CONFIG["ODOMETRY"]["max_speed_ms"]
+
+        self.next_gate = 0
+        self.laps_done = 0
+        self.started = False
+        self.lap_start = None
+        self.splits = []
+        self.last_lap_time = None
+        self._last = None
+        self._last_fix_time = None
+        # added to the NMEA times (s since midnight UTC) so they keep increasing past midnight
+        self._day_offset = 0
+
+    @property
+    def finished(self):
+        return self.laps_done >= self.course.laps
+
+    def _cross(self, gate, time):
+        if gate == 0:
+            if self.started:
+                self.laps_done += 1
+                self.last_lap_time = time - self.lap_start
+            self.started = True
+            self.lap_start = time
+            self.splits = []
+        else:
+            self.splits.append(time - self.lap_start)
+        self.next_gate = (gate + 1) % len(self.course.names)
+
+    def _fix_seconds(self, nmea_time):
+        """
+        Returns:
+            float: The time of a fix (s), from its hhmmss.ss NMEA time.
+        """
+        hours, rest = divmod(nmea_time, 10000)
+        minutes, seconds = divmod(rest, 100)
+        now = hours * 3600 + minutes * 60 + seconds + self._day_offset
+        if self._last is not None and now < self._last[0] - SECONDS_PER_DAY / 2:
+            self._day_offset += SECONDS_PER_DAY
+            now += SECONDS_PER_DAY
+        return now
+
+    def update(self, fix):
+        """
+        Moves the boat to a new fix.
+
+        Returns:
+            bool: False if the fix was ignored.
+        """
+        if (
+            not fix.get("valid", True) or fix.get("lat_deg") is None or fix.get("long_deg") is None
+            or fix.get("nmea_time") is None
+        ):
+            return False
+
+        now = self._fix_seconds(fix["nmea_time"])
+        position = self.course.project((fix["lat_deg"], fix["long_deg"]))
+        if self._last is None:
+            self._last = (now, position)
+            return True
+
+        last_time, last_position = self._last
+        dt = now - last_time
+        if dt <= 0 or np.hypot(*(position - last_position)) / dt > self.max_speed:
+            return False
+        self._last = (now, position)
+
+        for fraction, gate in self.course.crossings(last_position, position):
+            if gate == self.next_gate and not self.finished:
+                self._cross(gate, last_time + float(fraction) * dt)
+        return True
+
+    def status(self):
+        """
+        Returns:
+            dict: The race status, times in s and distances in m.
+        """
+        now, position = self._last
+        finished = self.finished
+        return {
+            "lap": min(self.laps_done + 1, self.course.laps),
+            "laps": self.course.laps,
+            "finished": finished,
+            "next_gate": None if finished else self.course.names[self.next_gate],
+            "distance_to_next_m": 0.0 if finished else self.course.distance_to_gate(position, self.next_gate),
+            "lap_time_s": now - self.lap_start if self.started and not finished else None,
+            "splits_s": list(self.splits),
+            "last_lap_s": self.last_lap_time,
+        }
+
+    def process_batch(self, items):
+        updated = False
+        for sample in items:
+            fix = sample.values
+            if "fix_time" not in fix:
+                continue
+            if self._last_fix_time is not None and fix["fix_time"] <= self._last_fix_time:
+                # same fix published again
+                continue
+            self._last_fix_time = fix["fix_time"]
+            updated = self.update(fix) or updated
+
+        if updated:
+            self.publish(self.status(), self._last_fix_time)
@@ -0,0 +1,127 @@
+"""
+Trip distance and speed computed from the GPS fixes.
+"""
+from multithreading.stage import Stage
+from config import CONFIG
+import math
+
+EARTH_RADIUS_M = 6371000
+KNOTS_TO_MS = 1852 / 3600
+
+
+def haversine(lat1, long1, lat2, long2):
+    """
+    Returns:
+        float: The great-circle distance between two points (m), given in decimal degrees.
+    """
+    lat1, long1, lat2, long2 = map(math.radians, (lat1, long1, lat2, long2))
+    a = math.sin((lat2 - lat1) / 2) ** 2 + math.cos(lat1) * math.cos(lat2) * math.sin((long2 - long1) / 2) ** 2
+    return 2 * EARTH_RADIUS_M * math.asin(math.sqrt(a))
+
+
+class Odometry(Stage):
+    """
+    Accumulates the distance travelled from the GPS fixes and publishes the trip metrics as the
+    ODOMETRY stream: distance, smoothed speed over ground, average and max speed and distance to
+    the finish. Each fix is handled in constant time.
+
+    Fixes are rejected when they are invalid or have no position, imply a speed above
+    "max_speed_ms" (jumps) or have a dilution of precision above "max_hdop". Moves shorter than "min_move_m" are not counted until they add up,
+    so the position noise does not accumulate while the boat is stopped.
+    """
+
+    def __init__(self, bus, config):
+        self.gps = CONFIG["GPS"]["name"]
+        super().__init__(bus, config, (self.gps,))
+
+        self.max_speed = config["max_speed_ms"]
+        self.max_hdop = config["max_hdop"]
+        self.min_move = config["min_move_m"]
+        self.time_constant = config["speed_time_constant_s"]
+        self.finish = config.get("finish")
+
+        self.distance = 0.0
+        self.speed = 0.0
+        self.max_smoothed_speed = 0.0
+        self.rejected = 0
+        self._start_time = None
+        # last position counted in the distance, and last accepted fix
+        self._anchor = None
+        self._last_fix = None
+        self._last_fix_time = None
+
+    def update(self, fix):
+        """
+        Updates the trip with a new fix.
+
+        Returns:
+            bool: False if the fix was rejected.
+        """
+        if (
+            not fix.get("valid", True) or fix.get("lat_deg") is None or fix.get("long_deg") is None
+            or (fix.get("hdop") is not None and fix["hdop"] > self.max_hdop)
+        ):
+            self.rejected += 1
+            return False
+
+        now = fix["fix_time"]
+        position = (fix["lat_deg"], fix["long_deg"])
+        if self._last_fix is None:
+            self._start_time = now
+            self._anchor = position
+            self._last_fix = (now, position)
+            return True
+
+        last_time, last_position = self._last_fix
+        dt = now - last_time
+        if dt <= 0:
+            return False
+        step = haversine(*last_position, *position)
+        if step / dt > self.max_speed:
+            self.rejected += 1
+            return False
+        self._last_fix = (now, position)
+
+        moved = haversine(*self._anchor, *position)
+        if moved >= self.min_move:
+            self.distance += moved
+            self._anchor = position
+
+        # speed reported by the receiver (Doppler) if any, smoothed with a time-based EMA
+        speed = step / dt if fix.get("speed_knots") is None else fix["speed_knots"] * KNOTS_TO_MS
+        self.speed += (speed - self.speed) * (1 - math.exp(-dt / self.time_constant))
+        self.max_smoothed_speed = max(self.max_smoothed_speed, self.speed)
+        return True
+
+    def metrics(self):
+        """
+        Returns:
+            dict: The trip metrics, distances in m and speeds in m/s.
+        """
+        elapsed = self._last_fix[0] - self._start_time if self._last_fix else 0.0
+        metrics = {
+            "distance_m": self.distance,
+            "elapsed_s": elapsed,
+            "speed_ms": self.speed,
+            "average_speed_ms": self.distance / elapsed if elapsed > 0 else 0.0,
+            "max_speed_ms": self.max_smoothed_speed,
+            "rejected": self.rejected,
+        }
+        if self.finish is not None and self._last_fix is not None:
+            metrics["distance_to_finish_m"] = haversine(*self._last_fix[1], *self.finish)
+        return metrics
+
+    def process_batch(self, items):
+        updated = False
+        for sample in items:
+            fix = sample.values
+            if "fix_time" not in fix:
+                continue
+            if self._last_fix_time is not None and fix["fix_time"] <= self._last_fix_time:
+                # same fix published again
+                continue
+            self._last_fix_time = fix["fix_time"]
+            updated = self.update(fix) or updated
+
+        if updated:
+            self.publish(self.metrics(), self._last_fix[0])
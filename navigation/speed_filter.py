@@ -0,0 +1,201 @@
+"""
+High-rate speed estimation: a Kalman filter integrating the accelerometer between the GPS fixes.
+"""
+from multithreading.stage import Stage
+from config import CONFIG
+import numpy as np
+
+KNOTS_TO_MS = 1852 / 3600
+
+
+class SpeedKalmanFilter:
+    """
+    Two-state Kalman filter: the speed over ground (m/s) and the bias of the longitudinal
+    acceleration (m/s2), which also absorbs the part of the gravity seen by a trimmed hull.
+    The accelerometer drives the prediction and the GPS speed corrects it.
+
+    The state, covariance and all the intermediate matrices are preallocated and updated in
+    place, so a step does not allocate any array.
+    """
+
+    def __init__(self, acceleration_noise, bias_noise, speed_noise):
+        """
+        Args:
+            acceleration_noise (float): The standard deviation of the accelerometer (m/s2).
+            bias_noise (float): The random walk of the acceleration bias (m/s2 per sqrt(s)).
+            speed_noise (float): The standard deviation of the GPS speed (m/s).
+        """
+        self.acceleration_variance = acceleration_noise ** 2
+        self.bias_variance = bias_noise ** 2
+        self.speed_variance = speed_noise ** 2
+
+        self.state = np.zeros(2)
+        self.covariance = np.zeros((2, 2))
+        self._transition = np.eye(2)
+        self._transition_t = self._transition.T
+        self._product = np.zeros((2, 2))
+        self._gain = np.zeros(2)
+        self._gain_column = self._gain[:, np.newaxis]
+        self._correction = np.zeros(2)
+        # views on the covariance: P H^T and H P, with H = [1, 0]
+        self._covariance_column = self.covariance[:, 0]
+        self._covariance_row = self.covariance[0, :]
+        self.initialized = False
+
+    def reset(self, speed):
+        """
+        Starts the filter from a GPS speed, with an unknown bias.
+        """
+        self.state[0] = speed
+        self.state[1] = 0.0
+        self.covariance.fill(0.0)
+        self.covariance[0, 0] = self.speed_variance
+        self.covariance[1, 1] = self.acceleration_variance
+        self.initialized = True
+
+    def predict(self, acceleration, dt):
+        """
+        Integrates a longitudinal acceleration (m/s2) over `dt` (s).
+        """
+        self.state[0] += (acceleration - self.state[1]) * dt
+
+        # P = F P F^T + Q, with F = [[1, -dt], [0, 1]]
+        self._transition[0, 1] = -dt
+        np.matmul(self._transition, self.covariance, out=self._product)
+        np.matmul(self._product, self._transition_t, out=self.covariance)
+        self.covariance[0, 0] += self.acceleration_variance * dt * dt
+        self.covariance[1, 1] += self.bias_variance * dt
+
+    def correct(self, speed):
+        """
+        Corrects the estimation with a GPS speed (m/s).
+        """
+        innovation = speed - self.state[0]
+        np.divide(self._covariance_column, self.covariance[0, 0] + self.speed_variance, out=self._gain)
+        np.multiply(self._gain, innovation, out=self._correction)
+        self.state += self._correction
+        # P = (I - K H) P
+        np.multiply(self._gain_column, self._covariance_row, out=self._product)
+        self.covariance -= self._product
+
+    @property
+    def speed(self):
+        return self.state[0]
+
+
+class SpeedFilter(Stage):
+    """
+    Publishes the "SPEED" stream: the speed over ground (m/s) at the accelerometer rate, with the
+    last GPS course. Both the high-rate captures (arrays) and the polled readings (tuples) of the
+    accelerometer are accepted, its x axis pointing forward.
+
+    Nothing is published until the first GPS speed, nor when the GPS speed is older than
+    "gps_timeout_s": the accelerometer alone would drift. The filter restarts from the first GPS
+    speed after such an outage.
+    """
+
+    def __init__(self, bus, config):
+        self.gps = CONFIG["GPS"]["name"]
+        self.accelerometer = CONFIG["ADXL345"]["name"]
+        super().__init__(bus, config, (self.gps, self.accelerometer))
+
+        self.filter = SpeedKalmanFilter(
+            config["acceleration_noise"], config["bias_noise"], config["speed_noise"]
+        )
+        self.gps_timeout = config["gps_timeout_s"]
+        self.course_angle = None
+        self._last_time = None
+        self._last_speed_time = None
+
+    def _correct(self, fix):
+        if "speed_time" not in fix or fix.get("speed_knots") is None or not fix.get("valid", True):
+            return
+        previous_speed_time = self._last_speed_time
+        if previous_speed_time is not None and fix["speed_time"] <= previous_speed_time:
+            # same speed published again, e.g. with a fix only updated by a GGA sentence
+            return
+        self._last_speed_time = fix["speed_time"]
+        self.course_angle = fix.get("course_angle")
+
+        speed = fix["speed_knots"] * KNOTS_TO_MS
+        if self.filter.initialized and fix["speed_time"] - previous_speed_time <= self.gps_timeout:
+            self.filter.correct(speed)
+        else:
+            # nothing was predicted during a GPS outage: the estimation is stale, start over
+            self.filter.reset(speed)
+
+    def _predict(self, times, accelerations):
+        """
+        Returns:
+            np.ndarray: The filtered speed after each acceleration.
+        """
+        speeds = np.empty(len(times))
+        for i in range(len(times)):
+            if self._last_time is not None and times[i] > self._last_time:
+                self.filter.predict(accelerations[i], times[i] - self._last_time)
+            self._last_time = times[i]
+            speeds[i] = self.filter.speed
+        return speeds
+
+    def process_batch(self, items):
+        times, speeds = [], []
+        for sample in items:
+            if sample.sensor == self.gps:
+                self._correct(sample.values)
+                continue
+
+            if isinstance(sample.values, dict):
+                # accelerometer high-rate capture
+                sample_times = np.asarray(sample.values["time"])
+                accelerations = np.asarray(sample.values["acceleration"]).reshape(-1, 3)[:, 0]
+            else:
+                sample_times = (sample.monotonic,)
+                accelerations = (sample.values[0],)
+
+            if (
+                not self.filter.initialized
+                or sample_times[-1] - self._last_speed_time > self.gps_timeout
+            ):
+                # only keep track of the time
+                self._last_time = sample_times[-1]
+                continue
+            times.append(np.asarray(sample_times, dtype=float))
+            speeds.append(self._predict(sample_times, accelerations))
+
+        if times:
+            times = np.concatenate(times)
+            self.publish(
+                {"time": times, "speed_ms": np.concatenate(speeds), "course_angle": self.course_angle},
+                times[-1]
+            )
+
+
+if __name__ == "__main__":
+    # Benchmark: filter steps/sec on a 10 min run at 100 Hz with a GPS speed every second, and
+    # error of the filtered and GPS speeds against the true speed.
+    # Run from the exopibrain directory: python -m navigation.speed_filter
+    import time
+
+    rate = 100
+    t = np.arange(0, 600, 1 / rate)
+    true_speed = 5 + 2 * np.sin(2 * np.pi * t / 60)
+    rng = np.random.default_rng(0)
+    acceleration = np.gradient(true_speed, t) + 0.15 + rng.normal(0, 0.3, t.size)
+    gps_speed = true_speed + rng.normal(0, 0.3, t.size)
+
+    kalman = SpeedKalmanFilter(0.3, 0.01, 0.3)
+    kalman.reset(gps_speed[0])
+    filtered = np.empty(t.size)
+    start = time.perf_counter()
+    for i in range(1, t.size):
+        kalman.predict(acceleration[i], 1 / rate)
+        if i % rate == 0:
+            kalman.correct(gps_speed[i])
+        filtered[i] = kalman.speed
+    elapsed = time.perf_counter() - start
+
+    held_gps = gps_speed[(np.arange(t.size) // rate) * rate]
+    print(f"{t.size / elapsed:.0f} steps/s")
+    print(f"rms error: filtered {np.sqrt(np.mean((filtered[rate:] - true_speed[rate:]) ** 2)):.3f} m/s, "
+          f"gps held {np.sqrt(np.mean((held_gps[rate:] - true_speed[rate:]) ** 2)):.3f} m/s, "
+          f"bias {kalman.state[1]:.3f} m/s2 (expected 0.15)")
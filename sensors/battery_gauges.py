@@ -1,5 +1,5 @@
+from multithreading.protocols.register_map import Field, RegisterMap
 from multithreading.protocols.smbus_stream_reader import SMBusStreamReader
-from utils import to_uint16
 import RPi.GPIO as GPIO
 import time
 
@@ -7,47 +7,95 @@ import time
 # battery gauge datasheet: https://www.analog.com/media/en/technical-documentation/data-sheets/2944fa.pdf
 # I2C multiplexer datasheet: https://www.analog.com/media/en/technical-documentation/data-sheets/4312f.pdf 
 class BatteryGauges(SMBusStreamReader):
+    """
+    Reads the two LTC2944 gauges (12V and 24V batteries), which share the same address behind a
+    multiplexer.
+
+    Each cycle visits each gauge once, all its operations grouped: read the result of the
+    conversion triggered on the previous cycle, then trigger the next one. The conversions run
+    between cycles, so nobody waits for them. The gauge selected at the end of a cycle is visited
+    first on the next one, so the multiplexer only switches once per cycle.
+    """
+
     CONTROL_REGISTER = 0x01
 
     VOLTAGE_REGISTER = 0x08
     CURRENT_REGISTER = 0x0E
     CHARGE_REGISTER = 0x02
+    CHARGE_REGISTER_LSB = 0x03
+
+    # registers 0x02 to 0x0F, read in a single transfer
+    GAUGE_REGISTERS = RegisterMap(
+        Field("charge_level", CHARGE_REGISTER, ">H"),
+        Field("voltage", VOLTAGE_REGISTER, ">H"),
+        Field("current", CURRENT_REGISTER, ">H"),
+    )
 
     # ADC mode: sleep, prescaler: 4096 (default), ALCC disabled
     INITIAL_CONFIGUARION = 0b00111000
     REQUEST_ADC_UPDATE = 0b01111000
+    # the analog section must be shut down while the charge register is written
+    SHUTDOWN = INITIAL_CONFIGUARION | 0b1
+
+    # value written to the charge register by `calibrate_full()`
+    FULL_CHARGE_COUNT = 0xFFFF
+
+    # the gauge puts the ADC back to sleep after a manual conversion, so the control register must
+    # be written on every request. The charge register is counted by the gauge.
+    VOLATILE_REGISTERS = (CONTROL_REGISTER, CHARGE_REGISTER, CHARGE_REGISTER_LSB)
 
+    # paid on every multiplexer switch, i.e. once per cycle with the gauges visited in `_plan()`
+    # order (twice when the selected gauge is unknown, after a reconfiguration)
     GAUGE_SWITCH_DELAY = 0.01
 
     # switch these if necessary
     GAUGE_24V = GPIO.HIGH
     GAUGE_12V = GPIO.LOW
+    GAUGES = {GAUGE_12V: "12V", GAUGE_24V: "24V"}
 
     def __init__(self, lock, data_queue, log_queue, config):
         super().__init__(lock, data_queue, log_queue, config)
         self._select_gpio = config["select_gpio"]
         GPIO.setmode(GPIO.BCM)
         GPIO.setup(self._select_gpio, GPIO.OUT)
+        # gauge currently selected by the multiplexer, None if unknown
+        self._gauge = None
 
     def try_connect(self):
         try:
-            with self.acquire_bus_lock():
-                # write to the first battery gauge ...
-                self._switch_gauge(self.GAUGE_12V)
-                self.write_byte(self.CONTROL_REGISTER, self.INITIAL_CONFIGUARION)
-
-                # ... and the second
-                self._switch_gauge(self.GAUGE_24V)
-                self.write_byte(self.CONTROL_REGISTER, self.INITIAL_CONFIGUARION)
+            self.bus_transaction(self._configure)
 
         except:
             return False
         
         return True
 
+    def _configure(self):
+        # the device may have been reset since the last configuration
+        self.invalidate_shadow()
+        # write to the first battery gauge ...
+        self._switch_gauge(self.GAUGE_12V)
+        self.write_byte(self.CONTROL_REGISTER, self.INITIAL_CONFIGUARION)
+
+        # ... and the second
+        self._switch_gauge(self.GAUGE_24V)
+        self.write_byte(self.CONTROL_REGISTER, self.INITIAL_CONFIGUARION)
+
+        # start the conversions read by the first cycle
+        self._request_adc_update(self.GAUGE_24V)
+        self._request_adc_update(self.GAUGE_12V)
+
+    def register_bank(self):
+        # both gauges share the same address behind the multiplexer
+        return self._gauge
+
     def _switch_gauge(self, gauge):
+        if gauge == self._gauge:
+            return
+
         GPIO.output(self._select_gpio, gauge)
         time.sleep(self.GAUGE_SWITCH_DELAY)
+        self._gauge = gauge
 
     def _request_adc_update(self, gauge):
         self._switch_gauge(gauge)
@@ -55,32 +103,64 @@ class BatteryGauges(SMBusStreamReader):
 
     def _read_gauge_values(self, gauge):
         self._switch_gauge(gauge)
-        voltage_data = self.read_block(self.VOLTAGE_REGISTER, 2)
-        current_data = self.read_block(self.CURRENT_REGISTER, 2)
-        charge_data = self.read_block(self.CHARGE_REGISTER, 2)
-        voltage = to_uint16(voltage_data[0], voltage_data[1])
-        current = to_uint16(current_data[0], current_data[1])
-        charge = to_uint16(charge_data[0], charge_data[1])
-        return voltage, current, charge
+        return self.GAUGE_REGISTERS.read(self)
+
+    def _plan(self):
+        """
+        Returns:
+            list: The gauges in the order to visit them this cycle, starting with the one already
+            selected.
+        """
+        gauges = list(self.GAUGES)
+        if self._gauge in gauges:
+            gauges.remove(self._gauge)
+            gauges.insert(0, self._gauge)
+        return gauges
+
+    def _read_gauges(self):
+        values = {}
+        for gauge in self._plan():
+            # result of the previous cycle's conversion, then the next conversion
+            values[self.GAUGES[gauge]] = self._read_gauge_values(gauge)
+            self._request_adc_update(gauge)
+        return values
+
+    def _write_charge(self, gauge, count):
+        self._switch_gauge(gauge)
+        self.write_byte(self.CONTROL_REGISTER, self.SHUTDOWN)
+        self.write_byte(self.CHARGE_REGISTER, count >> 8)
+        self.write_byte(self.CHARGE_REGISTER_LSB, count & 0xFF)
+        self.write_byte(self.CONTROL_REGISTER, self.INITIAL_CONFIGUARION)
+        self._request_adc_update(gauge)
+
+    def calibrate_full(self, battery):
+        """
+        Sets the charge register of a gauge to FULL_CHARGE_COUNT. To be done when its battery is
+        known to be full, e.g. right after charging, so the "full_count" of BATTERY_SOC holds.
+
+        Args:
+            battery (str): "12V" or "24V".
+        """
+        gauge = next(gauge for gauge, name in self.GAUGES.items() if name == battery)
+        self.bus_transaction(lambda: self._write_charge(gauge, self.FULL_CHARGE_COUNT))
 
     def read_raw_data(self):
-        with self.acquire_bus_lock():
-            # request new values from the sensors
-            self._request_adc_update(self.GAUGE_12V)
-            self._request_adc_update(self.GAUGE_24V)
-            # then read the values
-            voltage_12V, current_12V, charge_level_12V = self._read_gauge_values(self.GAUGE_12V)
-            voltage_24V, current_24V, charge_level_24V = self._read_gauge_values(self.GAUGE_24V)
-
-        return {
-            "12V": {
-                "voltage": voltage_12V,
-                "current": current_12V,
-                "charge_level": charge_level_12V,
-            },
-            "24V": {
-                "voltage": voltage_24V,
-                "current": current_24V,
-                "charge_level": charge_level_24V,
-            }
-        }
+        """
+        Returns:
+            dict: The charge level, voltage and current of each gauge, converted at the end of the
+            previous cycle.
+        """
+        values = self.bus_transaction(self._read_gauges)
+        return {"12V": values["12V"], "24V": values["24V"]}
+
+
+if __name__ == "__main__":
+    # Calibration, with the batteries full: python -m sensors.battery_gauges 12V 24V
+    import sys
+    from config import CONFIG
+    gauges = BatteryGauges(None, None, None, CONFIG["BATT_GAUGES"])
+    if not gauges.try_connect():
+        sys.exit("BatteryGauges: could not configure the gauges")
+    for battery in sys.argv[1:]:
+        gauges.calibrate_full(battery)
+        print(f"{battery}: charge register set to {gauges.FULL_CHARGE_COUNT:#06x}")
@@ -1,11 +1,17 @@
 from multithreading.protocols.serial_stream_reader import SerialStreamReader
+from sensors.nmea import NMEAFramer, PARSERS
 from sensors.sensor_error import InvalidDataError
-from serial.serialutil import SerialException
+import time
 
 class GPS(SerialStreamReader):
     """
     GPS Interfacing with Raspberry Pi using Python
     http://www.electronicwings.com
+
+    Every read drains all the bytes waiting on the serial port, so we never fall behind the
+    receiver. Only the newest sentence of each supported type (RMC, GGA, VTG) is parsed; the older
+    ones are counted as dropped. A read is invalid (and the sensor eventually degraded) when the
+    receiver has no fix, or when everything it sent was corrupt or unparsable.
     """
 
     def __init__(self, lock, data_queue, log_queue, config) -> None:
@@ -17,50 +23,69 @@ class GPS(SerialStreamReader):
             config (dict): The configuration for the sensor (serial port).
         """
         super().__init__(lock, data_queue, log_queue, config)
+        self.framer = NMEAFramer()
+        # valid sentences never parsed because a newer one of the same type arrived
+        self.dropped = 0
+        # valid sentences whose fields could not be parsed
+        self.unparsable = 0
+        # latest known fix, updated by each parsed sentence
+        self._fix = {}
 
-    def _convert_to_degrees(self, raw_value):
+    def read_raw_data(self):
         """
-        Converts raw gps value into decimal degrees
+        Reads all the pending data from the GPS sensor.
 
-        Args:
-            raw_value (float): The raw value from the GPS sensor.
-        
         Returns:
-            float: The converted value in decimal degrees.
-        """
-        decimal_value = raw_value / 100.00
-        degrees = int(decimal_value)
-        mm_mmmm = (decimal_value - int(decimal_value)) / 0.6
-        position = degrees + mm_mmmm
-        position = round(position, 5)
-        return position
+            dict: The newest fix (position, speed, course, ...), the monotonic time of the last
+            sentence it was updated from ("fix_time") and of the last one with a speed
+            ("speed_time"), and the dropped/corrupt sentence counters.
 
-    def read_raw_data(self):
+        Raises:
+            InvalidDataError: If the RMC sentence reports no fix (status "V"), or if sentences were
+                received but none of them could be used.
         """
-        Reads the raw data from the GPS sensor.
+        pending = self.ser.in_waiting
+        data = self.ser.read(pending) if pending else b""
+        corrupt = self.framer.corrupt + self.unparsable
 
-        Returns:
-            dict: The raw data from the GPS sensor.
-        """
-        gps_data = {}
-        try:
-            if self.ser.in_waiting:
-                received_data = (str)(self.ser.readline())
-                gprmc_data_available = received_data.find(
-                    "$GPRMC,"
-                )  # check for NMEA GPGGA string
-                if gprmc_data_available > 0:
-                    sentence = received_data.split("$GPRMC,", 1)[1]
-                    nmea_buff = sentence.split(",")
-                    gps_data["nmea_time"] = float(nmea_buff[0])
-                    gps_data["speed_knots"] = float(nmea_buff[6])
-                    gps_data["course_angle"] = 0.0 if nmea_buff[7] == "" else float(nmea_buff[7])
-                    gps_data["lat_deg"] = self._convert_to_degrees(float(nmea_buff[2]))
-                    gps_data["long_deg"] = self._convert_to_degrees(float(nmea_buff[4])) * -1        
-        except SerialException or ValueError:
+        newest = {}
+        for sentence_type, fields in self.framer.feed(data):
+            kind = sentence_type[2:]
+            if kind not in PARSERS:
+                continue
+            if kind in newest:
+                self.dropped += 1
+                # moved to the end: the sentences are applied in the order of their last copy,
+                # so an older sentence never overwrites the fields of a newer one
+                del newest[kind]
+            newest[kind] = fields
+
+        parsed = 0
+        for kind, fields in newest.items():
+            try:
+                values = PARSERS[kind](fields)
+            except (ValueError, IndexError):
+                self.unparsable += 1
+                continue
+            parsed += 1
+            self._fix.update(values)
+            self._fix["fix_time"] = time.monotonic()
+            if values.get("speed_knots") is not None:
+                # a GGA sentence leaves the speed of the previous RMC/VTG in the fix
+                self._fix["speed_time"] = self._fix["fix_time"]
+
+        if not parsed and self.framer.corrupt + self.unparsable > corrupt:
+            # noise on the line or a wrong baud rate
+            raise InvalidDataError
+        if b"RMC" in newest and not self._fix.get("valid", True):
+            # the receiver is talking but has no fix
             raise InvalidDataError
 
-        return gps_data
+        return {
+            **self._fix,
+            "dropped": self.dropped,
+            "corrupt": self.framer.corrupt + self.unparsable,
+        }
 
 if __name__ == "__main__":
     import time
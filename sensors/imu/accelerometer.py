@@ -8,9 +8,24 @@
 # http://shop.pimoroni.com/products/adafruit-triple-axis-accelerometer
 from multithreading.protocols.smbus_stream_reader import SMBusStreamReader
 from utils import to_int16
+import RPi.GPIO as GPIO
+import numpy as np
+import threading
+import time
 
 
 class Accelerometer(SMBusStreamReader):
+    """
+    Reads the acceleration on each axis.
+
+    With a "fifo" entry in its config, the accelerometer runs in high-rate capture mode: it samples
+    at "rate" Hz in its FIFO (stream mode) and raises its watermark interrupt (INT1, wired to
+    "interrupt_gpio") once "watermark" samples are waiting. Each read waits for that interrupt and
+    drains the whole FIFO in a few combined transfers, returning numpy arrays of samples and their
+    reconstructed (monotonic) times. Set "read_interval" to 0 so the reader only wakes up on the
+    interrupt.
+    """
+
     # ADXL345 constants
     DATA_FORMAT = 0x31
     BW_RATE = 0x2C
@@ -22,17 +37,38 @@ class Accelerometer(SMBusStreamReader):
     SCALE_MULTIPLIER = 0.004
     AXES_DATA = 0x32
 
+    # FIFO constants
+    INT_ENABLE = 0x2E
+    INT_MAP = 0x2F
+    FIFO_CTL = 0x38
+    FIFO_STATUS = 0x39
+    FIFO_STREAM = 0b10000000
+    FIFO_ENTRIES = 0b00111111
+    INT_WATERMARK = 0b00000010
+    # output data rate codes of BW_RATE, by rate (Hz)
+    DATA_RATES = {25: 0x08, 50: 0x09, 100: 0x0A, 200: 0x0B, 400: 0x0C, 800: 0x0D}
+
+    # let the measurements start
+    SETTLE_DELAYS = {POWER_CTL: SMBusStreamReader.WRITE_DELAY_S}
+    VOLATILE_REGISTERS = (FIFO_STATUS,)
+
     def __init__(self, lock, data_queue, log_queue, config):
         super().__init__(lock, data_queue, log_queue, config)
 
+        self._fifo = config.get("fifo")
+        if self._fifo is not None:
+            # set by the watermark interrupt, with its time
+            self._watermark = threading.Event()
+            self._watermark_time = None
+            GPIO.setmode(GPIO.BCM)
+            GPIO.setup(self._fifo["interrupt_gpio"], GPIO.IN)
+            GPIO.add_event_detect(self._fifo["interrupt_gpio"], GPIO.RISING, callback=self._on_watermark)
+
     def try_connect(self):
         # no need to add this to __init__ since the stream_reader class has its is_connected member to False
         # by default and will attempt to connect via the imu class
         try:
-            with self.acquire_bus_lock():
-                self.write_byte(self.BW_RATE, self.BW_RATE_100HZ)
-                self._set_range(self.RANGE_2G)
-                self.write_byte(self.POWER_CTL, self.MEASURE)
+            self.bus_transaction(self._configure)
 
         except:
             # failed to connect
@@ -40,6 +76,21 @@ class Accelerometer(SMBusStreamReader):
 
         return True
 
+    def _configure(self):
+        # the device may have been reset since the last configuration
+        self.invalidate_shadow()
+        if self._fifo is None:
+            self.write_byte(self.BW_RATE, self.BW_RATE_100HZ)
+            self._set_range(self.RANGE_2G)
+        else:
+            self.write_byte(self.BW_RATE, self.DATA_RATES[self._fifo["rate"]])
+            self._set_range(self.RANGE_2G)
+            # all interrupts on INT1, FIFO keeping the latest samples
+            self.write_byte(self.INT_MAP, 0x00)
+            self.write_byte(self.FIFO_CTL, self.FIFO_STREAM | self._fifo["watermark"])
+            self.write_byte(self.INT_ENABLE, self.INT_WATERMARK)
+        self.write_byte(self.POWER_CTL, self.MEASURE)
+
     def _set_range(self, range_flag):
         value = self.read_byte(self.DATA_FORMAT)
         value &= ~0x0F
@@ -47,12 +98,56 @@ class Accelerometer(SMBusStreamReader):
         value |= 0x08
         self.write_byte(self.DATA_FORMAT, value)
 
+    def _on_watermark(self, channel):
+        self._watermark_time = time.monotonic()
+        self._watermark.set()
+
+    def _read_fifo(self):
+        entries = self.read_byte(self.FIFO_STATUS) & self.FIFO_ENTRIES
+        return self.read_repeated(self.AXES_DATA, 6, entries)
+
+    def read_fifo(self):
+        """
+        Waits for the watermark interrupt (at most the time it takes to reach the watermark), then
+        reads all the samples in the FIFO.
+
+        Returns:
+            dict: "time", the monotonic time of each sample, and "acceleration", the (x, y, z)
+            acceleration of each sample in m/s^2, as numpy arrays.
+        """
+        rate = self._fifo["rate"]
+        watermark = self._fifo["watermark"]
+        interrupted = self._watermark.wait(watermark / rate)
+        # cleared before draining: a watermark raised from now on is for samples not read yet
+        self._watermark.clear()
+        interrupt_time = self._watermark_time
+
+        data = self.bus_transaction(self._read_fifo)
+        drain_time = time.monotonic()
+
+        acceleration = np.frombuffer(data, dtype="<i2").reshape(-1, 3)
+        acceleration = acceleration * (self.SCALE_MULTIPLIER * self.EARTH_GRAVITY_MS2)
+
+        # samples are evenly spaced: anchor them on the interrupt, raised when the sample at index
+        # `watermark - 1` was written. With any other count, the interrupt does not match this
+        # drain (FIFO overflow, samples written after the interrupt, stale event of samples already
+        # read): anchor them on the last sample instead, as when we timed out
+        if interrupted and len(acceleration) == watermark:
+            anchor_index, anchor_time = watermark - 1, interrupt_time
+        else:
+            anchor_index, anchor_time = len(acceleration) - 1, drain_time
+        times = anchor_time + (np.arange(len(acceleration)) - anchor_index) / rate
+
+        return {"time": times, "acceleration": acceleration}
+
     def read_raw_data(self):
         """
         returns the current reading from the sensor for each axis
         """
-        with self.acquire_bus_lock():
-            i2c_bytes = self.read_block(self.AXES_DATA, 6)
+        if self._fifo is not None:
+            return self.read_fifo()
+
+        i2c_bytes = self.bus_transaction(lambda: self.read_block(self.AXES_DATA, 6))
 
         x_acceleration = to_int16(i2c_bytes[1], i2c_bytes[0])
         y_acceleration = to_int16(i2c_bytes[3], i2c_bytes[2])
@@ -68,6 +163,13 @@ class Accelerometer(SMBusStreamReader):
 
         return x_acceleration, y_acceleration, z_acceleration
 
+    def close(self):
+        """
+        Stop listening to the watermark interrupt.
+        """
+        if self._fifo is not None:
+            GPIO.remove_event_detect(self._fifo["interrupt_gpio"])
+
 if __name__ == "__main__":
     import time
     from config import CONFIG
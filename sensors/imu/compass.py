@@ -1,5 +1,5 @@
+from multithreading.protocols.register_map import Field, RegisterMap
 from multithreading.protocols.smbus_stream_reader import SMBusStreamReader
-from utils import to_int16
 
 
 class Compass(SMBusStreamReader):
@@ -20,6 +20,19 @@ class Compass(SMBusStreamReader):
     STAT_OVL = 0b00000010  # Overflow flag.
     STAT_DOR = 0b00000100  # Data skipped for reading.
 
+    # let the mode changes apply
+    SETTLE_DELAYS = {
+        REG_CONTROL_1: SMBusStreamReader.WRITE_DELAY_S,
+        REG_CONTROL_2: SMBusStreamReader.WRITE_DELAY_S,
+    }
+
+    # the 3 axes are read in a single transfer
+    REGISTERS = RegisterMap(
+        Field("x", REG_XOUT_LSB, "<h"),
+        Field("y", REG_YOUT_LSB, "<h"),
+        Field("z", REG_ZOUT_LSB, "<h"),
+    )
+
     def __init__(self, lock, data_queue, log_queue, config):
         super().__init__(lock, data_queue, log_queue, config)
 
@@ -27,29 +40,25 @@ class Compass(SMBusStreamReader):
         # no need to add this to __init__ since the stream_reader class has its is_connected member to False
         # by default and will attempt to connect via the imu class
         try:
-            with self.acquire_bus_lock():
-                self.write_byte(self.REG_CONTROL_1, 0x00)
-                self.write_byte(self.REG_CONTROL_2, 0x4D)
+            self.bus_transaction(self._configure)
 
         except:
             return False
 
         return True
 
+    def _configure(self):
+        # the device may have been reset since the last configuration
+        self.invalidate_shadow()
+        self.write_byte(self.REG_CONTROL_1, 0x00)
+        self.write_byte(self.REG_CONTROL_2, 0x4D)
+
     def read_raw_data(self):
         """
         Read data from each axis of the compass.
         """
-        with self.acquire_bus_lock():
-            data_x = self.read_block(self.REG_XOUT_LSB, 2)
-            data_y = self.read_block(self.REG_YOUT_LSB, 2)
-            data_z = self.read_block(self.REG_ZOUT_LSB, 2)
-
-        global_x_heading = to_int16(data_x[1], data_x[0])
-        global_y_heading = to_int16(data_y[1], data_y[0])
-        global_z_heading = to_int16(data_z[1], data_z[0])
-        
-        return global_x_heading, global_y_heading, global_z_heading
+        headings = self.bus_transaction(lambda: self.REGISTERS.read(self))
+        return headings["x"], headings["y"], headings["z"]
 
 
 if __name__ == "__main__":
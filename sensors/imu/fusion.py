@@ -0,0 +1,209 @@
+from multithreading.stage import Stage
+from config import CONFIG
+import numpy as np
+
+# length of the blocks the filter recurrence is solved on at once: alpha ** -FILTER_BLOCK must stay
+# far from overflowing
+FILTER_BLOCK = 64
+
+
+def complementary_filter(angles, rates, alpha, dt, initial):
+    """
+    Complementary filter of a series of angles: the integrated angular rates give the short-term
+    changes, the absolute angles correct their drift over time.
+        y[n] = alpha * (y[n-1] + rates[n] * dt) + (1 - alpha) * angles[n]
+    This first-order IIR filter is solved in closed form on blocks of the series, with the inputs
+    u[n] = alpha * dt * rates[n] + (1 - alpha) * angles[n]:
+        y[n] = alpha^(n+1) * (y[-1] + sum(u[k] / alpha^(k+1), k <= n))
+
+    Args:
+        angles (np.ndarray): The absolute angles (deg).
+        rates (np.ndarray): The angular rates (deg/s).
+        alpha (float): The weight of the integrated rates, between 0 (excluded) and 1.
+        dt (float): The time between two values (s).
+        initial (float): The filtered angle before the first value.
+
+    Returns:
+        np.ndarray: The filtered angles.
+    """
+    inputs = alpha * dt * rates + (1 - alpha) * angles
+    powers = alpha ** np.arange(1, FILTER_BLOCK + 1)
+    filtered = np.empty_like(inputs)
+    previous = initial
+    for start in range(0, len(inputs), FILTER_BLOCK):
+        block = inputs[start:start + FILTER_BLOCK]
+        block_powers = powers[:len(block)]
+        filtered[start:start + len(block)] = block_powers * (previous + np.cumsum(block / block_powers))
+        previous = filtered[start + len(block) - 1]
+    return filtered
+
+
+def fuse(acceleration, angular_rate, magnetic_field, alpha, dt, state):
+    """
+    Computes the orientation at each time step from the three sensors, sampled at the same times,
+    on the x forward, y to port, z up axes. The heading is clockwise from the magnetic north.
+
+    Args:
+        acceleration (np.ndarray): (n, 3) acceleration (any unit).
+        angular_rate (np.ndarray): (n, 3) angular rate (deg/s), counterclockwise about each axis.
+        magnetic_field (np.ndarray): (n, 3) magnetic field (any unit).
+        alpha (float): The weight of the gyroscope in the filters, between 0 and 1.
+        dt (float): The time between two steps (s).
+        state (np.ndarray): The heel, trim and (unwrapped) heading before the first step, None to
+            start from the sensors' absolute angles.
+
+    Returns:
+        tuple: The heel, trim and heading (deg, [0, 360)) at each step and the new state.
+    """
+    ax, ay, az = acceleration.T
+    heel_acc = np.degrees(np.arctan2(ay, az))
+    trim_acc = np.degrees(np.arctan2(-ax, np.hypot(ay, az)))
+
+    if state is None:
+        # the heading starts from the compass, once it is computed
+        state = np.array([heel_acc[0], trim_acc[0], np.nan])
+    heel = complementary_filter(heel_acc, angular_rate[:, 0], alpha, dt, state[0])
+    trim = complementary_filter(trim_acc, angular_rate[:, 1], alpha, dt, state[1])
+
+    # tilt-compensated magnetic heading: the field rotated back to the level boat, whose y axis
+    # points to port, i.e. west when heading north
+    roll, pitch = np.radians(heel), np.radians(trim)
+    mx, my, mz = magnetic_field.T
+    x = mx * np.cos(pitch) + my * np.sin(roll) * np.sin(pitch) + mz * np.cos(roll) * np.sin(pitch)
+    y = my * np.cos(roll) - mz * np.sin(roll)
+    heading_mag = np.degrees(np.unwrap(np.arctan2(y, x)))
+    if np.isnan(state[2]):
+        state[2] = heading_mag[0]
+    # keep the magnetic heading within half a turn of the filtered one, so they do not wrap apart
+    heading_mag += 360 * np.round((state[2] - heading_mag[0]) / 360)
+    # turning counterclockwise about z (up) decreases the heading
+    heading = complementary_filter(heading_mag, -angular_rate[:, 2], alpha, dt, state[2])
+
+    return heel, trim, np.mod(heading, 360), np.array([heel[-1], trim[-1], heading[-1]])
+
+
+class OrientationFusion(Stage):
+    """
+    Fuses the Accelerometer, Gyroscope and Compass streams into the heel, trim and heading of the
+    boat, published as the "Orientation" stream at a fixed rate.
+
+    Each batch of input samples is resampled on a fixed time grid (the accelerometer's time, the
+    slower sensors being interpolated or held) and filtered in numpy, so the cost per output step
+    is constant whatever the batch size. The sensors' axes are assumed to be aligned: x forward,
+    y to port, z up.
+    """
+
+    # ITG3205 sensitivity (LSB per deg/s)
+    GYRO_SENSITIVITY = 14.375
+
+    def __init__(self, bus, config):
+        self.accelerometer = CONFIG["ADXL345"]["name"]
+        self.gyroscope = CONFIG["ITG3205"]["name"]
+        self.compass = CONFIG["HMC5883L"]["name"]
+        super().__init__(bus, config, (self.accelerometer, self.gyroscope, self.compass))
+
+        self.rate = config["rate"]
+        self.alpha = config["alpha"]
+        # last (times, values) of each input, to interpolate across batches
+        self._last = {}
+        self._next_time = None
+        self._state = None
+
+    def _series(self, name, samples):
+        """
+        Returns:
+            tuple: The times and (n, 3) values of a sensor in the batch, preceded by its last value
+            of the previous batches. None if the sensor was never read.
+        """
+        times, values = [], []
+        if name in self._last:
+            times.append(self._last[name][0][-1:])
+            values.append(self._last[name][1][-1:])
+
+        for sample in samples:
+            if sample.sensor != name:
+                continue
+            if isinstance(sample.values, dict):
+                # accelerometer high-rate capture
+                times.append(np.asarray(sample.values["time"]))
+                values.append(np.asarray(sample.values["acceleration"]).reshape(-1, 3))
+            else:
+                times.append(np.array([sample.monotonic]))
+                values.append(np.array([sample.values], dtype=float))
+
+        if not times:
+            return None
+        series = (np.concatenate(times), np.concatenate(values))
+        self._last[name] = series
+        return series
+
+    def process_batch(self, items):
+        accel = self._series(self.accelerometer, items)
+        gyro = self._series(self.gyroscope, items)
+        mag = self._series(self.compass, items)
+        if accel is None or gyro is None or mag is None:
+            return
+
+        if self._next_time is None:
+            self._next_time = accel[0][0]
+        steps = int(np.floor((accel[0][-1] - self._next_time) * self.rate)) + 1
+        if steps <= 0:
+            return
+        times = self._next_time + np.arange(steps) / self.rate
+        self._next_time = times[-1] + 1 / self.rate
+
+        def resample(series):
+            return np.column_stack([np.interp(times, series[0], series[1][:, axis]) for axis in range(3)])
+
+        heel, trim, heading, self._state = fuse(
+            resample(accel), resample(gyro) / self.GYRO_SENSITIVITY, resample(mag),
+            self.alpha, 1 / self.rate, self._state
+        )
+        self.publish({"time": times, "heel": heel, "trim": trim, "heading": heading}, times[-1])
+
+
+if __name__ == "__main__":
+    # Benchmark: fused samples/sec on a 60 s recording at 100 Hz of a boat rolling, pitching and
+    # turning to starboard, with sensor noise, processed in batches of increasing size.
+    # Run from the exopibrain directory: python -m sensors.imu.fusion
+    import time
+
+    rate = 100
+    t = np.arange(0, 60, 1 / rate)
+    roll = np.radians(10 * np.sin(2 * np.pi * 0.3 * t))
+    pitch = np.radians(4 * np.sin(2 * np.pi * 0.5 * t))
+    yaw = np.radians(3 * t)
+    rng = np.random.default_rng(0)
+    acceleration = np.column_stack([
+        -9.81 * np.sin(pitch), 9.81 * np.sin(roll) * np.cos(pitch), 9.81 * np.cos(roll) * np.cos(pitch)
+    ]) + rng.normal(0, 0.2, (t.size, 3))
+    angular_rate = np.column_stack([
+        np.degrees(np.gradient(roll, t)), np.degrees(np.gradient(pitch, t)), -np.degrees(np.gradient(yaw, t))
+    ]) + rng.normal(0, 0.5, (t.size, 3))
+    # field pointing north and down, seen from the level boat (x forward, y to port), then tilted
+    north, down = 1.0, 0.3
+    level = np.column_stack([north * np.cos(yaw), north * np.sin(yaw), np.full(t.size, -down)])
+    pitched = np.column_stack([
+        np.cos(pitch) * level[:, 0] - np.sin(pitch) * level[:, 2],
+        level[:, 1],
+        np.sin(pitch) * level[:, 0] + np.cos(pitch) * level[:, 2],
+    ])
+    magnetic_field = np.column_stack([
+        pitched[:, 0],
+        np.cos(roll) * pitched[:, 1] + np.sin(roll) * pitched[:, 2],
+        -np.sin(roll) * pitched[:, 1] + np.cos(roll) * pitched[:, 2],
+    ])
+
+    for batch in (1, 16, 100, 1000):
+        state = None
+        start = time.perf_counter()
+        for i in range(0, t.size, batch):
+            window = slice(i, i + batch)
+            heel, trim, heading, state = fuse(
+                acceleration[window], angular_rate[window], magnetic_field[window], 0.98, 1 / rate, state
+            )
+        elapsed = time.perf_counter() - start
+        print(f"batch of {batch:4d}: {t.size / elapsed:12.0f} samples/s")
+
+    print(f"last orientation: heel {heel[-1]:.1f}, trim {trim[-1]:.1f}, heading {heading[-1]:.1f} "
+          f"(expected {np.degrees(roll[-1]):.1f}, {np.degrees(pitch[-1]):.1f}, {np.degrees(yaw[-1]) % 360:.1f})")
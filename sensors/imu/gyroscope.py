@@ -13,26 +13,32 @@ class Gyroscope(SMBusStreamReader):
     DLPF_256_8 = 0x18
     DATA_REG = 0x1D
 
+    # let the clock switch to the gyro PLL
+    SETTLE_DELAYS = {POWER_MANAGEMENT: SMBusStreamReader.WRITE_DELAY_S}
+
     def __init__(self, lock, data_queue, log_queue, config):
         super().__init__(lock, data_queue, log_queue, config)
 
     def try_connect(self):
         try:
-            with self.acquire_bus_lock():
-                self.write_byte(self.POWER_MANAGEMENT, self.PLL_X_GYRO)
-                self.write_byte(self.DLPF_FS, self.DLPF_256_8)
+            self.bus_transaction(self._configure)
 
         except:
             return False
 
         return True
 
+    def _configure(self):
+        # the device may have been reset since the last configuration
+        self.invalidate_shadow()
+        self.write_byte(self.POWER_MANAGEMENT, self.PLL_X_GYRO)
+        self.write_byte(self.DLPF_FS, self.DLPF_256_8)
+
     def read_raw_data(self):
         """
         Read data from each axis of the gyroscope.
         """
-        with self.acquire_bus_lock():
-            data = self.read_block(self.DATA_REG, 6)
+        data = self.bus_transaction(lambda: self.read_block(self.DATA_REG, 6))
 
         # Convert the data
         local_x_orientation = to_int16(data[0], data[1])
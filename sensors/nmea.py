@@ -0,0 +1,152 @@
+"""
+Incremental NMEA 0183 framing and parsing, working directly on the bytes read from the GPS.
+"""
+
+
+class NMEAFramer:
+    """
+    Splits a byte stream into NMEA sentences, validating their checksum. Bytes are fed as they
+    arrive; incomplete sentences are kept until the rest is received.
+    """
+
+    # longest valid sentence, with "$" and "\r\n" (the standard allows 82, with some slack for
+    # proprietary sentences)
+    MAX_SENTENCE_LENGTH = 128
+
+    def __init__(self):
+        self._buffer = bytearray()
+        # sentences discarded because they were malformed or their checksum did not match
+        self.corrupt = 0
+
+    def feed(self, data):
+        """
+        Adds received bytes to the stream.
+
+        Args:
+            data (bytes): The bytes received since the last call.
+
+        Returns:
+            list: The (sentence type, fields) of each complete and valid sentence, in order. The
+            type includes the talker (e.g. b"GPRMC"), the fields are bytes.
+        """
+        self._buffer += data
+        sentences = []
+        start = self._buffer.find(b"$")
+        while start != -1:
+            end = self._buffer.find(b"\n", start)
+            if end == -1:
+                break
+
+            # a new sentence starting before the end means the previous one was cut
+            restart = self._buffer.rfind(b"$", start + 1, end)
+            if restart != -1:
+                self.corrupt += 1
+                start = restart
+
+            sentence = self.parse_sentence(bytes(self._buffer[start + 1:end]).rstrip(b"\r"))
+            if sentence is None:
+                self.corrupt += 1
+            else:
+                sentences.append(sentence)
+            start = self._buffer.find(b"$", end)
+
+        if start == -1:
+            # only garbage left (or nothing)
+            self._buffer.clear()
+        else:
+            del self._buffer[:start]
+            if len(self._buffer) > self.MAX_SENTENCE_LENGTH:
+                # never terminated
+                self.corrupt += 1
+                self._buffer.clear()
+
+        return sentences
+
+    @staticmethod
+    def parse_sentence(body):
+        """
+        Args:
+            body (bytes): A sentence without its "$" and line ending, e.g. b"GPRMC,...*6A".
+
+        Returns:
+            tuple: The sentence type and its fields, or None if its checksum is missing or wrong.
+        """
+        star = body.rfind(b"*")
+        if star == -1 or len(body) - star != 3:
+            return None
+
+        checksum = 0
+        for byte in body[:star]:
+            checksum ^= byte
+        try:
+            if checksum != int(body[star + 1:], 16):
+                return None
+        except ValueError:
+            return None
+
+        fields = body[:star].split(b",")
+        return fields[0], fields[1:]
+
+
+def _float(field):
+    return float(field) if field else None
+
+
+def _degrees(value, hemisphere):
+    """
+    Converts a (d)ddmm.mmmm NMEA coordinate to signed decimal degrees.
+    """
+    if not value:
+        return None
+
+    value = float(value)
+    degrees = int(value // 100)
+    degrees += (value - degrees * 100) / 60
+    return round(-degrees if hemisphere in (b"S", b"W") else degrees, 6)
+
+
+def parse_rmc(fields):
+    """
+    Recommended minimum data: time, validity, position, speed and course.
+    """
+    return {
+        "nmea_time": _float(fields[0]),
+        "valid": fields[1] == b"A",
+        "lat_deg": _degrees(fields[2], fields[3]),
+        "long_deg": _degrees(fields[4], fields[5]),
+        "speed_knots": _float(fields[6]),
+        "course_angle": _float(fields[7]) or 0.0,
+    }
+
+
+def parse_gga(fields):
+    """
+    Fix data: time, position, fix quality, satellites, dilution of precision and altitude.
+    """
+    return {
+        "nmea_time": _float(fields[0]),
+        "lat_deg": _degrees(fields[1], fields[2]),
+        "long_deg": _degrees(fields[3], fields[4]),
+        "fix_quality": int(fields[5]) if fields[5] else 0,
+        "satellites": int(fields[6]) if fields[6] else 0,
+        "hdop": _float(fields[7]),
+        "altitude_m": _float(fields[8]),
+    }
+
+
+def parse_vtg(fields):
+    """
+    Course and speed over ground.
+    """
+    return {
+        "course_angle": _float(fields[0]) or 0.0,
+        "speed_knots": _float(fields[4]),
+    }
+
+
+# parser of each supported sentence, by sentence type without the talker
+PARSERS = {
+    b"RMC": parse_rmc,
+    b"GGA": parse_gga,
+    b"VTG": parse_vtg,
+}
@@ -15,6 +15,9 @@ class RPCPUTemperature(StreamReader):
         super().__init__(lock, data_queue, log_queue, config)
         self.monitor = CPUTemperature()
 
+    def monitored_values(self, data):
+        return (("temperature", data["temperature"], self.config["warning_temperature"]),)
+
     def read_raw_data(self):
         """
         Reads the raw data from the sensor.
@@ -1,4 +1,8 @@
 from multithreading.stream_reader import StreamReader
+from sensors.sensor_error import SensorConnectionError, InvalidDataError
+from sensors.w1_devices import W1DeviceIndex
+import errno
+import math
 import os
 import time
 
@@ -9,22 +13,76 @@ class Thermocouples(StreamReader):
     """
     Reads temperature data from the DS18B20 thermocouples.
 
-    Since all the sensors take roughly 750ms to read and we can only read them sequentially,
-    there will be a delay of 750ms * number_of_sensors between each read.
+    Each conversion takes roughly 750ms at 12-bit resolution. When the w1-therm driver supports
+    it, all the sensors convert at once (bulk read) and every read refreshes all of them in about
+    one conversion time. Otherwise they are read sequentially, one per read, so each sensor is
+    refreshed every conversion_time * number_of_sensors.
+
+    The resolution of each sensor is set by its "resolution" config: 9 to 12 bits (94ms to 750ms
+    per conversion) or "auto", which uses fast, coarse conversions while the sensor is far from
+    its "warn" temperature (or has none) and one more bit each time the distance to it halves,
+    starting at "resolution_margin" degrees. A bulk conversion lasts as long as its slowest
+    sensor, so all the sensors then use the highest resolution needed by one of them.
+
+    The sensors present on the bus are tracked by a W1DeviceIndex: absent sensors are skipped
+    without touching the filesystem. A read is invalid (and the sensor eventually degraded) when
+    the conversions read all failed their CRC check.
     """
 
+    W1_DEVICES = "/sys/bus/w1/devices"
+    BULK_READ_FILE = f"{W1_DEVICES}/w1_bus_master1/therm_bulk_read"
+    # time between two checks of the bulk conversion status
+    BULK_POLL_S = 0.01
+    # longest a bulk conversion can take (12-bit resolution), with some margin
+    BULK_TIMEOUT_S = 1
+
+    MIN_RESOLUTION = 9
+    MAX_RESOLUTION = 12
+
     def __init__(self, lock, data_queue, log_queue, config):
         super().__init__(lock, data_queue, log_queue, config)
 
         self._values = {name: float("nan") for name in config["sensors"].keys()}
         self._names = list(config["sensors"].keys())
         addresses = [config["sensors"][name]["address"] for name in config["sensors"].keys()]
-        self._device_files = [f"/sys/bus/w1/devices/28-{address:012x}/w1_slave" for address in addresses]
+        self._devices = [f"28-{address:012x}" for address in addresses]
+        self._device_files = [f"{self.W1_DEVICES}/{device}/w1_slave" for device in self._devices]
+        self._temperature_files = [f"{self.W1_DEVICES}/{device}/temperature" for device in self._devices]
+        self._resolution_files = [f"{self.W1_DEVICES}/{device}/resolution" for device in self._devices]
+        # resolution last applied to each sensor
+        self._resolutions = {}
         self._current_sensor_index = 0
 
         # Thermocouple data wire should be linked to GPIO4 (see boot/config.txt, last line)
         os.system('modprobe w1-gpio')
         os.system('modprobe w1-therm')
+        self._bulk = os.path.isfile(self.BULK_READ_FILE)
+
+        self.devices = W1DeviceIndex(self.W1_DEVICES)
+        self.devices.start()
+
+    def try_connect(self):
+        """
+        Checks that the 1-Wire bus is available and at least one sensor is connected to it.
+        """
+        self.devices.rescan()
+        return bool(self.devices.present(self._devices))
+
+    def present_sensors(self):
+        """
+        Returns:
+            list: The names of the configured sensors currently present on the bus.
+        """
+        return [name for name, device in zip(self._names, self._devices) if self.devices.is_present(device)]
+
+    def _sensor_lost(self, index):
+        """
+        Marks a sensor that could not be read as absent until the next rescan.
+        """
+        print(f"Warning: the temperature sensor \"{self._names[index]}\" is not connected.")
+        self.devices.mark_absent(self._devices[index])
+        # it will come back with its default resolution
+        self._resolutions.pop(self._names[index], None)
 
     def _read_current_sensor(self):
         """
@@ -33,22 +91,24 @@ class Thermocouples(StreamReader):
         Returns:
             False if the sensor is not connected
             True otherwise
+
+        Raises:
+            InvalidDataError: If the conversion failed its CRC check.
         """
         name = self._names[self._current_sensor_index]
-        device_file = self._device_files[self._current_sensor_index]
 
-        if not os.path.isfile(device_file):
+        try:
+            with open(self._device_files[self._current_sensor_index], 'r') as f:
+                lines = f.readlines()
+        except OSError:
+            self._sensor_lost(self._current_sensor_index)
             self._current_sensor_index += 1
-            print(f"Warning: the temperature sensor \"{name}\" is not connected.")
             return False
 
-        with open(self._device_files[self._current_sensor_index], 'r') as f:
-            lines = f.readlines()
-
         if lines[0].strip()[-3:] != 'YES':
             self._current_sensor_index += 1
             print(f"Warning: invalid data received from \"{name}\" temperature sensor.")
-            return True
+            raise InvalidDataError
 
         equals_pos = lines[1].find('t=')
         if equals_pos != -1:
@@ -58,23 +118,155 @@ class Thermocouples(StreamReader):
         self._current_sensor_index += 1
         return True
 
+    def _target_resolution(self, name):
+        """
+        Returns:
+            int: The resolution (bits) the sensor should use for its next conversion.
+        """
+        sensor = self.config["sensors"][name]
+        resolution = sensor.get("resolution", self.MAX_RESOLUTION)
+        if resolution != "auto":
+            return resolution
+
+        if not sensor["warn"]:
+            # placeholder thresholds are left at 0 in the config: nothing to get precise for
+            return self.MIN_RESOLUTION
+
+        temperature = self._values[name]
+        if math.isnan(temperature):
+            # never read yet: be precise
+            return self.MAX_RESOLUTION
+
+        distance = (sensor["warn"] - temperature) / self.config["resolution_margin"]
+        resolution = self.MIN_RESOLUTION
+        while distance <= 1 and resolution < self.MAX_RESOLUTION:
+            resolution += 1
+            distance *= 2
+        return resolution
+
+    def _apply_resolutions(self):
+        """
+        Writes the resolution of the sensors whose target resolution changed.
+        """
+        targets = {
+            name: self._target_resolution(name)
+            for name, device in zip(self._names, self._devices) if self.devices.is_present(device)
+        }
+        if self._bulk and targets:
+            # the bulk conversion waits for the slowest sensor: the others get its precision for free
+            highest = max(targets.values())
+            targets = dict.fromkeys(targets, highest)
+
+        for name, resolution_file in zip(self._names, self._resolution_files):
+            resolution = targets.get(name)
+            if resolution is None or self._resolutions.get(name) == resolution:
+                continue
+
+            # remembered even if the write fails, so a read-only attribute is not retried every read
+            self._resolutions[name] = resolution
+            try:
+                with open(resolution_file, 'w') as f:
+                    f.write(f"{resolution}\n")
+            except OSError:
+                print(f"Warning: could not set the resolution of the \"{name}\" temperature sensor.")
+
+    def _read_bulk(self):
+        """
+        Triggers a conversion on all the sensors at once, waits for it, then reads every sensor.
+
+        Returns:
+            The number of sensors read, or None if bulk read is not available (the sequential path
+            is used from then on).
+
+        Raises:
+            InvalidDataError: If no sensor could be read because of invalid data.
+        """
+        try:
+            with open(self.BULK_READ_FILE, 'w') as f:
+                f.write("trigger\n")
+
+            # -1: conversion in progress, 1: done, 0: no conversion pending
+            deadline = time.monotonic() + self.BULK_TIMEOUT_S
+            while time.monotonic() < deadline:
+                with open(self.BULK_READ_FILE, 'r') as f:
+                    if f.read().strip() != "-1":
+                        break
+                time.sleep(self.BULK_POLL_S)
+        except OSError:
+            print("Warning: 1-Wire bulk read unavailable, reading the temperature sensors one by one.")
+            self._bulk = False
+            return None
+
+        read_count = 0
+        invalid_count = 0
+        for index, (name, temperature_file) in enumerate(zip(self._names, self._temperature_files)):
+            if not self.devices.is_present(self._devices[index]):
+                continue
+            try:
+                with open(temperature_file, 'r') as f:
+                    self._values[name] = int(f.read()) / 1000.0
+                read_count += 1
+            except OSError as e:
+                if e.errno != errno.EIO:
+                    self._sensor_lost(index)
+                    continue
+                # the driver reports a failed CRC check as an I/O error
+                invalid_count += 1
+                print(f"Warning: invalid data received from \"{name}\" temperature sensor.")
+            except ValueError:
+                invalid_count += 1
+                print(f"Warning: invalid data received from \"{name}\" temperature sensor.")
+
+        if read_count == 0 and invalid_count:
+            raise InvalidDataError
+        return read_count
+
+    def monitored_values(self, data):
+        sensors = self.config["sensors"]
+        return ((name, temperature, sensors[name]["warn"]) for name, temperature in data.items())
+
     def read_raw_data(self):
         """
         Reads the raw data from the thermocouple with correct formatting.
 
         Returns:
-            float: The raw temperature data from the thermocouple.
+            dict: The last temperature read from each thermocouple. This is a copy: the values
+            keep being updated by the next reads.
         """
-        if self._current_sensor_index >= len(self._device_files):
-            self._current_sensor_index = 0
+        self._apply_resolutions()
+
+        if self._bulk:
+            read_count = self._read_bulk()
+            if read_count == 0:
+                raise SensorConnectionError
+            if read_count is not None:
+                return dict(self._values)
+
+        # try each present sensor at most once, starting from the current one
+        read_successful = False
+        for _ in range(len(self._devices)):
+            if self._current_sensor_index >= len(self._devices):
+                self._current_sensor_index = 0
+
+            if not self.devices.is_present(self._devices[self._current_sensor_index]):
+                self._current_sensor_index += 1
+                continue
 
-        read_successful = self._read_current_sensor()
-        read_counter = 5 # prevent being stuck in an infinite loop
-        while not read_successful and read_counter > 0:
-            read_counter -= 1
             read_successful = self._read_current_sensor()
+            if read_successful:
+                break
+
+        if not read_successful:
+            # none of the sensors are connected anymore
+            raise SensorConnectionError
+
+        return dict(self._values)
 
-        return self._values
+    def close(self):
+        """
+        Stop rescanning the bus.
+        """
+        self.devices.stop()
 
 if __name__ == "__main__":
     import time
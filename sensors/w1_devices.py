@@ -0,0 +1,60 @@
+from multithreading.thread import LoopingThread
+import os
+
+
+class W1DeviceIndex(LoopingThread):
+    """
+    Index of the devices present on the 1-Wire bus, built from the w1 sysfs directory and kept up
+    to date by a low-frequency background rescan (hotplug), so the readers can skip absent devices
+    without touching the filesystem.
+
+    The index is copy-on-write: lookups never take a lock.
+    """
+
+    RESCAN_INTERVAL_S = 10
+
+    def __init__(self, devices_dir):
+        """
+        Args:
+            devices_dir (str): The w1 sysfs directory listing the devices, e.g. /sys/bus/w1/devices.
+        """
+        super().__init__()
+        # does not keep the program alive when the readers are not run as threads
+        self.daemon = True
+        self.devices_dir = devices_dir
+        self._present = frozenset()
+        self.rescan()
+
+    def rescan(self):
+        """
+        Lists the devices currently on the bus.
+        """
+        try:
+            self._present = frozenset(os.listdir(self.devices_dir))
+        except OSError:
+            self._present = frozenset()
+
+    def is_present(self, device):
+        """
+        Args:
+            device (str): The name of the device directory, e.g. 28-00000e841698.
+        """
+        return device in self._present
+
+    def present(self, devices):
+        """
+        Returns:
+            list: The devices among `devices` that are present on the bus.
+        """
+        present = self._present
+        return [device for device in devices if device in present]
+
+    def mark_absent(self, device):
+        """
+        Removes a device that disappeared before the next rescan.
+        """
+        self._present = self._present - {device}
+
+    def run(self):
+        while not self.wait(self.RESCAN_INTERVAL_S):
+            self.rescan()
@@ -0,0 +1,65 @@
+"""
+Benchmark: items/sec consumed from a SampleBus subscription fed by a bursty producer, one item per
+wakeup (as before batching) vs batched draining. Telemetry goes to /dev/null so each write is still
+a real syscall.
+
+The Pi-only modules are stubbed, so it runs on any machine (pyserial is still needed).
+Run from the exopibrain directory: python tests/benchmark_consumers.py
+"""
+import os
+import sys
+import time
+import types
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# config.py reads the GPIO pins from `board`, only available on the Pi: any pin name will do
+board = types.ModuleType("board")
+board.__getattr__ = lambda name: name
+sys.modules.setdefault("board", board)
+
+from multithreading.consumers import Consumer, DataConsumer, LogConsumer
+from multithreading.sample import Sample
+from multithreading.sample_bus import SampleBus, BLOCK
+
+
+class _NoGUI:
+    def dispatch_alert(self, alert_type):
+        pass
+
+
+def benchmark(make_consumer, batch_size, n_items=50000):
+    bus = SampleBus()
+    subscription = bus.subscribe("bench", capacity=1000, policy=BLOCK)
+    consumer = make_consumer(subscription)
+    consumer.BATCH_SIZE = batch_size
+
+    start = time.perf_counter()
+    consumer.start()
+    for i in range(n_items):
+        bus.publish(Sample("Accelerometer", 1, i + 1, time.monotonic(), time.time(), (0.01 * i, -0.02, 9.81)))
+    while subscription.consumed < n_items:
+        time.sleep(0.001)
+    elapsed = time.perf_counter() - start
+
+    consumer.stop()
+    consumer.join()
+    return n_items / elapsed
+
+
+def make_log_consumer(subscription):
+    # no port: the serial port is created but not opened
+    consumer = LogConsumer(None, subscription, None, None)
+    consumer.serial = open(os.devnull, "wb", buffering=0)
+    return consumer
+
+
+def make_data_consumer(subscription):
+    return DataConsumer(None, subscription, _NoGUI())
+
+
+if __name__ == "__main__":
+    for name, make_consumer in (("LogConsumer", make_log_consumer), ("DataConsumer", make_data_consumer)):
+        before = benchmark(make_consumer, batch_size=1)
+        after = benchmark(make_consumer, batch_size=Consumer.BATCH_SIZE)
+        print(f"{name}: {before:.0f} items/s one at a time, {after:.0f} items/s batched ({after / before:.1f}x)")
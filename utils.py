@@ -5,9 +5,9 @@ import json
 import constants
 
 
-def stringify_data(name, data_dict, start_char="", end_char=""):
+def stringify_data(sample, start_char="", end_char=""):
     """
-    Stringifies data dicts for logging.
+    Stringifies samples for logging.
     i.e. for fuel cell a:
     <start_char>FUELCELL_A {'temp':87.90, ...}<end_char>
 
@@ -15,9 +15,18 @@ def stringify_data(name, data_dict, start_char="", end_char=""):
     """
 
     # Name and json string separated by space
-    data_str = f"{start_char}{name} {json.dumps(data_dict)}{end_char}"
+    data_str = f"{start_char}{sample.sensor} {json.dumps(sample.values, default=json_default)}{end_char}"
     return data_str
 
+def json_default(value):
+    """
+    Serializes the values json does not support natively, i.e. the numpy arrays and scalars of the
+    high-rate sensors. To be passed as `default` to `json.dumps`.
+    """
+    if hasattr(value, "tolist"):
+        return value.tolist()
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
 def to_uint16(msb, lsb):
     """
     Converts two bytes to a 16-bit unsigned integer.